@@ -0,0 +1,29 @@
+"""Fallbacks for features of newer Python versions"""
+import threading
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python < 3.7
+
+    class ContextVar(object):
+        """Thread local stand-in for ``contextvars.ContextVar``
+
+        Values are not carried over to coroutines resumed from the event
+        loop, which only matters for asynchronous pipelines.
+        """
+
+        def __init__(self, name, default=None):
+            self.name = name
+            self.default = default
+            self._local = threading.local()
+
+        def get(self):
+            return getattr(self._local, "value", self.default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
@@ -0,0 +1,365 @@
+"""Move the expensive parts of pipelines onto parallel backends"""
+from functools import wraps
+import os
+import pickle
+import time
+
+from . import core, parallel
+from .graph import _method_node, decorate_nodes, undecorate_nodes
+from .profiler import Profiler
+from .serialize import _node_arguments
+
+# the core nodes which have a parallel counterpart running on the backend
+_parallel_nodes = {
+    getattr(core, name): getattr(parallel, name)
+    for name in ["map", "starmap", "filter", "pluck"]
+}
+
+# seconds of local overhead per submitted task and bytes per second moved
+# to and from the workers, None for backends sharing memory
+_backend_costs = {
+    "thread": {"task_overhead": 1e-4, "bandwidth": None},
+    "dask": {"task_overhead": 1e-3, "bandwidth": 1e8},
+}
+
+
+def _payload_size(x):
+    try:
+        return len(pickle.dumps(x, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        # unpicklable data can not be shipped to workers
+        return float("inf")
+
+
+class _PayloadRecorder(object):
+    """Record the pickled size of every element entering each node
+
+    This is entered before the ``Profiler`` so that the time spent pickling
+    is attributed to the node itself and can be taken out of its stats.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nbytes = {n: 0 for n in graph.nodes}
+        self.seconds = {n: 0.0 for n in graph.nodes}
+        self._decorated = {}
+
+    def __enter__(self):
+        self._decorated = decorate_nodes(
+            self.graph, update_decorator=self._decorator
+        )
+        return self
+
+    def __exit__(self, *exc):
+        undecorate_nodes(self._decorated)
+
+    def _decorator(self, func):
+        n = hash(_method_node(func))
+
+        @wraps(func)
+        def wrapper(x, *args, **kwargs):
+            start = time.perf_counter()
+            self.nbytes[n] += _payload_size(x)
+            self.seconds[n] += time.perf_counter() - start
+            return func(x, *args, **kwargs)
+
+        return wrapper
+
+
+def _chains(graph):
+    """Maximal chains of nodes which can be moved to a parallel backend
+
+    Inside a chain every node has exactly one upstream and one downstream,
+    the last node may have any number of downstreams.
+    """
+
+    def movable(n):
+        node = graph.nodes[n]["node"]()
+        return (
+            type(node) in _parallel_nodes
+            and len(node.upstreams) == 1
+            and node.upstreams[0] is not None
+        )
+
+    chains = []
+    for n in graph.nodes:
+        if not movable(n):
+            continue
+        (up,) = graph.predecessors(n)
+        if movable(up) and graph.out_degree(up) == 1:
+            # not the start of a chain
+            continue
+        chain = [n]
+        while graph.out_degree(chain[-1]) == 1:
+            (down,) = graph.successors(chain[-1])
+            if not movable(down):
+                break
+            chain.append(down)
+        chains.append(chain)
+    return chains
+
+
+def _estimate(segment, graph, stats, nbytes, workers, costs):
+    """Estimate the per element cost of a segment run serially and in
+    parallel"""
+    calls = [stats[n]["calls"] for n in segment]
+    if not calls[0]:
+        return None
+    n_elements = calls[0]
+    compute = sum(stats[n]["wall_exclusive"] for n in segment) / n_elements
+    tasks = sum(calls) / n_elements
+    # the segment output is whatever its downstream nodes received
+    out_bytes = max(
+        [nbytes[d] for d in graph.successors(segment[-1])] or [0]
+    )
+    transfer = 0.0
+    if costs["bandwidth"]:
+        transfer = (nbytes[segment[0]] + out_bytes) / (
+            costs["bandwidth"] * n_elements
+        )
+    # scatter and gather are tasks too
+    overhead = costs["task_overhead"] * (tasks + 2) + transfer
+    # the local overhead and the remote work are pipelined, the workers
+    # pay the task overhead as well
+    remote = (compute + costs["task_overhead"] * tasks) / workers
+    parallel_time = max(overhead, remote)
+    return {
+        "compute": compute,
+        "overhead": overhead,
+        "speedup": compute / parallel_time if parallel_time else 1.0,
+        "saved": compute - parallel_time,
+    }
+
+
+def _pays_off(n, stats, costs):
+    """Whether the compute of a node covers the overhead of its own tasks"""
+    return stats[n]["wall_exclusive"] > costs["task_overhead"] * max(
+        stats[n]["calls"], 1
+    )
+
+
+def _best_segments(
+    chain, graph, stats, nbytes, workers, costs, min_speedup=1.5
+):
+    """Pick the contiguous parts of a chain which pay off in parallel
+
+    The nodes at both ends of a segment have to pay for their own tasks, so
+    cheap nodes, whose measured time is mostly the instrumentation, are not
+    pulled into a segment.
+    """
+    args = (graph, stats, nbytes, workers, costs)
+    best = None
+    for i in range(len(chain)):
+        if not _pays_off(chain[i], stats, costs):
+            continue
+        for j in range(i + 1, len(chain) + 1):
+            if not _pays_off(chain[j - 1], stats, costs):
+                continue
+            est = _estimate(chain[i:j], *args)
+            if est is None or est["speedup"] < min_speedup:
+                continue
+            if best is None or est["saved"] > best[2]["saved"]:
+                best = (i, j, est)
+    if best is None:
+        return []
+    i, j, est = best
+    return (
+        _best_segments(chain[:i], *args, min_speedup=min_speedup)
+        + [(chain[i:j], est)]
+        + _best_segments(chain[j:], *args, min_speedup=min_speedup)
+    )
+
+
+def plan_parallel(
+    node,
+    sample,
+    backend="thread",
+    workers=None,
+    task_overhead=None,
+    bandwidth=None,
+    min_speedup=1.5,
+):
+    """Find the parts of a pipeline which are worth running in parallel
+
+    The sample data is emitted into ``node`` while the pipeline is profiled,
+    so sinks see the sample data too (``link.Template`` can be used to reset
+    the pipeline afterwards). Chains of ``map``, ``starmap``, ``filter``
+    and ``pluck`` nodes are candidates, a chain pays off if its compute time
+    spread over the workers beats the local cost of submitting its tasks
+    and moving its data. The nodes at the ends of a moved chain have to
+    cover the overhead of their own tasks.
+
+    Parameters
+    ----------
+    node : Stream instance
+        The node to emit the sample data into
+    sample : iterable
+        The sample data
+    backend : str, optional
+        The backend the pipeline would run on, defaults to "thread"
+    workers : int, optional
+        The number of workers of the backend, defaults to the number of
+        CPUs
+    task_overhead : float, optional
+        Seconds of local overhead per submitted task, defaults to an
+        estimate for the backend
+    bandwidth : float or None, optional
+        Bytes per second moved to and from the workers, defaults to an
+        estimate for the backend. Zero means the workers share memory.
+    min_speedup : float, optional
+        The estimated speedup a chain needs to be moved, defaults to 1.5
+
+    Returns
+    -------
+    list of dict
+        One entry per chain to be moved, holding the ``nodes``, their
+        readable ``names``, the per element ``compute`` and ``overhead``
+        time in seconds and the estimated ``speedup``
+    """
+    costs = dict(_backend_costs.get(backend, _backend_costs["dask"]))
+    if task_overhead is not None:
+        costs["task_overhead"] = task_overhead
+    if bandwidth is not None:
+        costs["bandwidth"] = bandwidth
+    workers = workers or os.cpu_count() or 1
+
+    prof = Profiler(node)
+    with _PayloadRecorder(prof.graph) as payloads, prof:
+        for x in sample:
+            node.emit(x)
+    stats = {n: dict(prof.stats[name]) for n, name in prof.names.items()}
+    for n, seconds in payloads.seconds.items():
+        stats[n]["wall_exclusive"] -= seconds
+
+    plans = []
+    for chain in _chains(prof.graph):
+        for segment, est in _best_segments(
+            chain,
+            prof.graph,
+            stats,
+            payloads.nbytes,
+            workers,
+            costs,
+            min_speedup=min_speedup,
+        ):
+            plans.append(
+                {
+                    "nodes": [prof.graph.nodes[n]["node"]() for n in segment],
+                    "names": [prof.names[n] for n in segment],
+                    "compute": est["compute"],
+                    "overhead": est["overhead"],
+                    "speedup": est["speedup"],
+                }
+            )
+    return plans
+
+
+# the attributes besides ``upstreams`` which refer to upstream nodes, for
+# the nodes whose bookkeeping is known
+_upstream_attributes = [
+    (core._zip, ["buffers", "arrivals"]),
+    (core._combine_latest, ["missing", "emit_on"]),
+    (core._zip_latest, ["missing", "lossless"]),
+]
+
+
+def _replaced(value, old, new):
+    if value is old:
+        return new
+    if isinstance(value, dict):
+        # buffers keyed by upstream, eg in ``zip``
+        return {(new if k is old else k): v for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return type(value)(new if u is old else u for u in value)
+    return value
+
+
+def _rewire(downstream, old, new):
+    """Replace an upstream of a node in place, keeping its position"""
+    downstream.upstreams[:] = _replaced(downstream.upstreams, old, new)
+    for cls, attributes in _upstream_attributes:
+        if isinstance(downstream, cls):
+            for k in attributes:
+                if hasattr(downstream, k):
+                    setattr(
+                        downstream,
+                        k,
+                        _replaced(getattr(downstream, k), old, new),
+                    )
+    old.downstreams.remove(downstream)
+    new.downstreams.add(downstream)
+
+
+def parallelize(nodes, backend="thread"):
+    """Move a chain of nodes onto a parallel backend
+
+    The chain is replaced by a ``scatter``, the parallel counterparts of
+    the nodes and a ``gather``, keeping the execution order of the
+    surrounding nodes.
+
+    Parameters
+    ----------
+    nodes : list of Stream instances
+        The chain, as returned by ``plan_parallel``
+    backend : str or callable, optional
+        The backend, defaults to "thread"
+
+    Returns
+    -------
+    Stream instance
+        The ``gather`` node replacing the last node of the chain
+    """
+    first, last = nodes[0], nodes[-1]
+    upstream = first.upstreams[0]
+    od = upstream.downstreams.data._od
+    after = list(od)[[r() for r in od].index(first) + 1 :]
+
+    new = parallel.scatter(upstream, backend=backend)
+    upstream.downstreams.remove(first)
+    # put the scatter where the first node was in the execution order
+    for r in after:
+        od.move_to_end(r)
+    for node in nodes:
+        args, kwargs = _node_arguments(node)
+        new = _parallel_nodes[type(node)](new, *args[1:], **kwargs)
+    gathered = parallel.gather(new)
+    for downstream in list(last.downstreams):
+        _rewire(downstream, last, gathered)
+    return gathered
+
+
+def autoparallelize(node, sample, backend="thread", **kwargs):
+    """Profile a pipeline and move the parts worth it onto a parallel
+    backend
+
+    Parameters
+    ----------
+    node : Stream instance
+        The node to emit the sample data into
+    sample : iterable
+        The sample data, this is emitted into the pipeline
+    backend : str, optional
+        The backend to run on, defaults to "thread"
+    kwargs :
+        Passed to ``plan_parallel``
+
+    Returns
+    -------
+    list of dict
+        The chains which were moved, as returned by ``plan_parallel``
+
+    Examples
+    --------
+    >>> source = Stream(asynchronous=True)
+    >>> source.map(parse).map(expensive).sink(print)
+    >>> autoparallelize(source, sample_data)
+    >>> # source.map(parse).scatter().map(expensive).gather().sink(print)
+
+    See Also
+    --------
+    plan_parallel
+    """
+    plans = plan_parallel(node, sample, backend=backend, **kwargs)
+    for plan in plans:
+        parallelize(plan["nodes"], backend=backend)
+    return plans
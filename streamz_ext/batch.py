@@ -1 +1,201 @@
+from collections.abc import Mapping
+
 from zstreamz.batch import *
+from zstreamz.collection import Streaming, _stream_types
+
+
+class ColumnBatch(object):
+    """ A batch of records stored column wise in numpy arrays
+
+    Slicing rows or selecting columns returns views of the arrays, so no
+    data is copied, and functions work on whole columns at once instead of
+    creating a Python object per record.
+
+    Parameters
+    ----------
+    columns : mapping
+        The arrays (or array likes) of the batch by column name, all of the
+        same length
+
+    Examples
+    --------
+    >>> b = ColumnBatch.from_records([{'x': 1, 'y': 2}, {'x': 3, 'y': 4}])
+    >>> b.filter(lambda b: b['x'] > 2).to_records()
+    [{'x': 3, 'y': 4}]
+    >>> b.map(lambda b: {'z': b['x'] + b['y']})['z']
+    array([3, 7])
+    """
+
+    def __init__(self, columns):
+        import numpy as np
+
+        self.columns = {k: np.asarray(v) for k, v in columns.items()}
+        lengths = {len(v) for v in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(
+                "Columns have different lengths: {}".format(
+                    {k: len(v) for k, v in self.columns.items()}
+                )
+            )
+
+    @classmethod
+    def from_records(cls, records, columns=None):
+        """Create a batch from a sequence of dicts or tuples
+
+        Parameters
+        ----------
+        records : sequence of dicts or tuples
+            The records, eg an element of a ``Batch``
+        columns : list, optional
+            The columns to take from the records, defaults to the keys of
+            the first dict or the positions of the first tuple
+        """
+        import numpy as np
+
+        records = list(records)
+        if columns is None:
+            if not records:
+                columns = []
+            elif isinstance(records[0], Mapping):
+                columns = list(records[0])
+            else:
+                columns = range(len(records[0]))
+        return cls({c: np.array([r[c] for r in records]) for c in columns})
+
+    @classmethod
+    def concat(cls, batches):
+        """Concatenate batches with the same columns"""
+        import numpy as np
+
+        batches = list(batches)
+        return cls(
+            {
+                k: np.concatenate([b.columns[k] for b in batches])
+                for k in batches[0].columns
+            }
+        )
+
+    def to_records(self):
+        """Convert to a list of dicts, or tuples if the columns are
+        positions"""
+        names = list(self.columns)
+        rows = zip(*[v.tolist() for v in self.columns.values()])
+        if names == list(range(len(names))):
+            return list(rows)
+        return [dict(zip(names, row)) for row in rows]
+
+    def __len__(self):
+        for v in self.columns.values():
+            return len(v)
+        return 0
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def __repr__(self):
+        return "ColumnBatch<{} rows, columns={}>".format(
+            len(self), list(self.columns)
+        )
+
+    def __getitem__(self, key):
+        if isinstance(key, list) and all(k in self.columns for k in key):
+            return type(self)({k: self.columns[k] for k in key})
+        try:
+            if key in self.columns:
+                return self.columns[key]
+        except TypeError:
+            # arrays are not hashable
+            pass
+        # rows by slice, boolean mask or positions, slices are views
+        return type(self)({k: v[key] for k, v in self.columns.items()})
+
+    def map(self, func, **kwargs):
+        """Apply a function to the whole batch
+
+        The function gets the batch and works on its columns, a returned
+        mapping of arrays becomes a new batch.
+        """
+        result = func(self, **kwargs)
+        if isinstance(result, Mapping):
+            return type(self)(result)
+        return result
+
+    def filter(self, predicate, **kwargs):
+        """Keep the rows where the predicate, applied to the whole batch,
+        returns True"""
+        import numpy as np
+
+        return self[np.asarray(predicate(self, **kwargs), dtype=bool)]
+
+    def pluck(self, ind):
+        """Pick a column, or a batch of a list of columns"""
+        return self[ind]
+
+
+class Columnar(Streaming):
+    """ A Stream of ``ColumnBatch`` elements
+
+    Examples
+    --------
+    >>> records = Batch(example=[{'x': 1, 'y': 2}])
+    >>> cols = to_columnar(records)
+    >>> cols.filter(lambda b: b['x'] > 1).pluck('y').stream.sink(print)
+    """
+
+    _subtype = ColumnBatch
+
+    def __init__(self, stream=None, example=None):
+        if example is None:
+            example = ColumnBatch({})
+        super(Columnar, self).__init__(stream=stream, example=example)
+
+    def map(self, func, **kwargs):
+        """ Map a function across all batches, see ``ColumnBatch.map`` """
+        return self.map_partitions(_map, self, func, **kwargs)
+
+    def filter(self, predicate, **kwargs):
+        """ Filter rows by a vectorized predicate """
+        return self.map_partitions(_filter_rows, self, predicate, **kwargs)
+
+    def pluck(self, ind):
+        """ Pick a column, or a list of columns, out of all batches """
+        return self.map_partitions(_pluck_columns, self, ind)
+
+    def to_batch(self):
+        """ Convert to a ``Batch`` of records """
+        return self.map_partitions(ColumnBatch.to_records, self)
+
+    def to_stream(self):
+        """ Concatenate batches and return base Stream of records """
+        return self.to_batch().to_stream()
+
+
+def _map(batch, func, **kwargs):
+    return batch.map(func, **kwargs)
+
+
+def _filter_rows(batch, predicate, **kwargs):
+    return batch.filter(predicate, **kwargs)
+
+
+def _pluck_columns(batch, ind):
+    return batch.pluck(ind)
+
+
+def to_columnar(batch, columns=None):
+    """Convert a ``Batch`` of records into a stream of ``ColumnBatch``
+
+    Parameters
+    ----------
+    batch : Batch
+        The batches of dicts or tuples
+    columns : list, optional
+        The columns to take from the records, see
+        ``ColumnBatch.from_records``
+    """
+    return batch.map_partitions(
+        ColumnBatch.from_records, batch, columns=columns
+    )
+
+
+_stream_types["streaming"].insert(0, (ColumnBatch, Columnar))
@@ -1,8 +1,10 @@
 from collections import Sequence
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import wraps
+import itertools
+import queue
+import threading
 
-from distributed import default_client as dask_default_client
 from tornado import gen
 
 from .core import identity
@@ -45,8 +47,8 @@ def executor_to_client(executor):
     executor.submit = inner
 
     @gen.coroutine
-    def scatter(x, asynchronous=True):
-        f = executor.submit(identity, x)
+    def scatter(x, asynchronous=True, **kwargs):
+        f = executor.submit(identity, x, **kwargs)
         return f
 
     executor.scatter = getattr(executor, "scatter", scatter)
@@ -68,6 +70,81 @@ def executor_to_client(executor):
     return executor
 
 
+class _PriorityWorkQueue(queue.PriorityQueue):
+    """Work queue running higher priorities first, in submission order within
+    a priority"""
+
+    def __init__(self):
+        super().__init__()
+        # the priority of the next work item put into the queue
+        self.priority = 0
+        self._counter = itertools.count()
+
+    def _put(self, item):
+        # ``None`` shuts the workers down after all the work is done
+        key = float("inf") if item is None else -self.priority
+        super()._put((key, next(self._counter), item))
+
+    def _get(self):
+        return super()._get()[-1]
+
+
+def _pending_priorities(args):
+    """The priorities of the futures among the arguments which are not
+    done"""
+    for a in args:
+        if isinstance(a, Future):
+            if not a.done() and hasattr(a, "priority"):
+                yield a.priority
+        elif isinstance(a, (list, tuple)):
+            yield from _pending_priorities(a)
+
+
+class PriorityThreadPoolExecutor(ThreadPoolExecutor):
+    """A ``ThreadPoolExecutor`` whose ``submit`` takes a ``priority``
+
+    Queued tasks with higher priorities run first, like dask's
+    ``priority=``. Running tasks are not interrupted. Tasks wait on their
+    input futures in their worker thread, so a task must not start before
+    its inputs: its priority is capped at the lowest priority of its inputs
+    which are not done, since it is queued after them it then runs after
+    them too.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._work_queue = _PriorityWorkQueue()
+        self._priority_lock = threading.Lock()
+
+    def submit(self, fn, *args, priority=0, **kwargs):
+        inputs = list(args) + list(kwargs.values())
+        priority = min([priority] + list(_pending_priorities(inputs)))
+        with self._priority_lock:
+            self._work_queue.priority = priority
+            future = super().submit(fn, *args, **kwargs)
+        future.priority = priority
+        return future
+
+
+def _supports_priority(client):
+    """Whether ``submit`` of a client takes a ``priority``"""
+    if isinstance(client, PriorityThreadPoolExecutor):
+        return True
+    # dask clients, without importing ``distributed``
+    cls = type(client)
+    return (
+        cls.__module__.startswith("distributed") and cls.__name__ == "Client"
+    )
+
+
+def dask_default_client():
+    """The default dask client, ``distributed`` is only imported when
+    this is called"""
+    from distributed import default_client
+
+    return default_client()
+
+
 thread_ex_list = []
 
 
@@ -76,10 +153,10 @@ def thread_default_client():
         ex = thread_ex_list[0]
         if ex._shutdown:
             thread_ex_list.pop()
-            ex = executor_to_client(ThreadPoolExecutor())
+            ex = executor_to_client(PriorityThreadPoolExecutor())
             thread_ex_list.append(ex)
     else:
-        ex = executor_to_client(ThreadPoolExecutor())
+        ex = executor_to_client(PriorityThreadPoolExecutor())
         thread_ex_list.append(ex)
     return ex
 
@@ -1,14 +1,20 @@
+import asyncio
 from collections import Hashable
 from collections.abc import Sequence
+from functools import wraps
 import threading
+from time import time
+import traceback
 
+from tornado.ioloop import IOLoop
 from zstreamz.core import *
 from zstreamz.core import (
+    buffer as _buffer,
     combine_latest as _combine_latest,
     zip as _zip,
     zip_latest as _zip_latest,
 )
-from zstreamz.core import _global_sinks, _truthy
+from zstreamz.core import _global_sinks, _truthy, sync
 
 
 def apply(func, args, args2=None, kwargs=None):
@@ -110,6 +116,11 @@ class filter(Stream):
         if self.predicate(x, *self.args, **self.kwargs):
             return self._emit(x)
 
+    def _prepare_swap(self, changes):
+        if "predicate" in changes and changes["predicate"] is None:
+            changes["predicate"] = _truthy
+        return changes
+
 
 @Stream.register_api()
 class unique(Stream):
@@ -156,6 +167,261 @@ class unique(Stream):
                 return self._emit(x)
 
 
+def apply_batched(func, batch, stack=True, args=(), kwargs=None):
+    """Apply a vectorized function to a batch of elements
+
+    Parameters
+    ----------
+    func : callable
+        The vectorized function, it must return one result per element
+    batch : list
+        The elements
+    stack : bool, optional
+        If True (default) the elements are stacked into a numpy array before
+        being passed to ``func``, otherwise the list is passed
+    args : tuple, optional
+        Extra arguments for ``func``
+    kwargs : dict, optional
+        Extra keyword arguments for ``func``
+
+    Returns
+    -------
+    list
+        The results, in the order of the elements
+    """
+    if stack:
+        import numpy as np
+
+        batch = np.asarray(batch)
+    results = func(batch, *args, **(kwargs or {}))
+    if len(results) != len(batch):
+        raise ValueError(
+            "{} returned {} results for {} elements".format(
+                func, len(results), len(batch)
+            )
+        )
+    return list(results)
+
+
+@Stream.register_api()
+class map_batched(Stream):
+    """ Apply a vectorized function to batches of elements
+
+    Elements are collected until ``n`` of them arrived (or ``interval``
+    seconds passed since the first one), the batch is stacked into a numpy
+    array and the function is called once on it. The results are emitted one
+    by one, in order. This removes the per element overhead for functions
+    which work on whole arrays, like numpy ufuncs.
+
+    Parameters
+    ----------
+    func : callable
+        The vectorized function, it must return one result per element
+    *args :
+        The arguments to pass to the function.
+    n : int, optional
+        The number of elements in a batch, defaults to 1000
+    interval : float or str, optional
+        The maximum number of seconds to hold an element, if None (default)
+        batches are only emitted once they are full
+    stack : bool, optional
+        If True (default) the batch is passed as a numpy array, otherwise as
+        a list
+    **kwargs:
+        Keyword arguments to pass to func
+
+    Examples
+    --------
+    >>> source = Stream()
+    >>> source.map_batched(np.sqrt, n=3).sink(print)
+    >>> for x in [1, 4, 9]:
+    ...     source.emit(x)
+    1.0
+    2.0
+    3.0
+    """
+
+    def __init__(
+        self,
+        upstream,
+        func,
+        *args,
+        n=1000,
+        interval=None,
+        stack=True,
+        **kwargs
+    ):
+        self.func = func
+        self.n = n
+        self.interval = convert_interval(interval)
+        self.stack = stack
+        stream_name = kwargs.pop("stream_name", None)
+        self.kwargs = kwargs
+        self.args = args
+        self.buffer = []
+        # identifies the batch a timeout was scheduled for
+        self._batch = 0
+        # timeouts flush on the loop while elements may arrive from other
+        # threads, batches are taken and emitted one at a time
+        self._lock = threading.RLock()
+
+        Stream.__init__(
+            self,
+            upstream,
+            stream_name=stream_name,
+            ensure_io_loop=interval is not None,
+        )
+
+    def update(self, x, who=None):
+        with self._lock:
+            self.buffer.append(x)
+            if len(self.buffer) == 1 and self.interval is not None:
+                # ``call_later`` is not thread safe
+                self.loop.add_callback(
+                    self.loop.call_later,
+                    self.interval,
+                    self._timeout,
+                    self._batch,
+                )
+            if len(self.buffer) >= self.n:
+                return self.flush()
+        return []
+
+    def _timeout(self, batch):
+        with self._lock:
+            if batch == self._batch and self.buffer:
+                self.flush()
+
+    def _compute(self, batch):
+        return apply_batched(
+            self.func, batch, self.stack, self.args, self.kwargs
+        )
+
+    def flush(self):
+        """Emit the results for the elements collected so far"""
+        with self._lock:
+            batch, self.buffer = self.buffer, []
+            self._batch += 1
+            if not batch:
+                return []
+            L = []
+            for result in self._compute(batch):
+                y = self._emit(result)
+                if type(y) is list:
+                    L.extend(y)
+                else:
+                    L.append(y)
+            return L
+
+
+@Stream.register_api()
+class shard(Stream):
+    """ Route every element to one of ``n`` lanes by the hash of its key
+
+    All the elements with the same key go through the same lane. The lanes
+    are plain nodes in ``lanes``, the shard itself does not emit.
+
+    Parameters
+    ----------
+    key : callable
+        Computes the key of an element
+    n : int
+        The number of lanes
+
+    See Also
+    --------
+    partition_by
+    """
+
+    def __init__(self, upstream, key, n, **kwargs):
+        self.key = key
+        self.n = n
+        Stream.__init__(self, upstream, **kwargs)
+        self.lanes = [
+            Stream(upstream=self, stream_name="lane {}".format(i))
+            for i in range(n)
+        ]
+
+    def update(self, x, who=None):
+        lane = self.lanes[hash(self.key(x)) % self.n]
+        # ``Stream.update`` drops the futures returned by ``_emit``
+        return lane._emit(x)
+
+
+@Stream.register_api()
+def partition_by(upstream, key, n, pipeline, backend=None):
+    """Run ``n`` replicas of a pipeline, routing elements by key
+
+    Elements with the same key always go to the same replica, so stateful
+    nodes (``accumulate``, ``unique``, ...) see every element of their keys
+    while the replicas run independently. The outputs of the replicas are
+    merged with ``union``, the order is only kept within a key.
+
+    Parameters
+    ----------
+    upstream : Stream instance
+    key : callable
+        Computes the key of an element
+    n : int
+        The number of replicas
+    pipeline : callable
+        Builds a replica, it is called with the input node of the replica
+        and returns its output node
+    backend : str, callable or list, optional
+        If given every replica is scattered to this backend (and ``pipeline``
+        should use parallel nodes), a list gives one backend per replica so
+        that each replica can get its own pool of workers
+
+    Returns
+    -------
+    Stream instance
+        The node merging the outputs of the replicas
+
+    Examples
+    --------
+    >>> source = Stream()
+    >>> totals = source.partition_by(
+    ...     lambda x: x['detector'], 4,
+    ...     lambda s: s.pluck('counts').accumulate(op.add))
+    """
+    if backend is None or isinstance(backend, str) or callable(backend):
+        backend = [backend] * n
+    router = shard(upstream, key, n)
+    outputs = []
+    for i, lane in enumerate(router.lanes):
+        b = backend[i]
+        if b is not None:
+            lane = lane.scatter(backend=b)
+        out = pipeline(lane)
+        if b is not None:
+            out = out.gather()
+        outputs.append(out)
+    return union(*outputs)
+
+
+def backlog_stats(arrivals, high_water):
+    """Summarize a backlog from the arrival times of the waiting elements
+
+    Parameters
+    ----------
+    arrivals : Sequence of float
+        The arrival times of the waiting elements, oldest first
+    high_water : int
+        The largest backlog seen
+
+    Returns
+    -------
+    dict
+        The current ``backlog``, the ``oldest_age`` of the waiting elements in
+        seconds and the ``high_water`` mark
+    """
+    return {
+        "backlog": len(arrivals),
+        "oldest_age": time() - arrivals[0] if arrivals else 0.0,
+        "high_water": high_water,
+    }
+
+
 def move_to_first(node, f=True):
     """Promote current node to first in the execution order
 
@@ -186,6 +452,169 @@ def move_to_first(node, f=True):
     return node
 
 
+def _isolated(node, update, dead_letter):
+    @wraps(update)
+    def inner(x, who=None):
+        try:
+            return update(x, who=who)
+        except Exception as e:
+            dead_letter.emit(
+                {
+                    "node": node,
+                    "element": x,
+                    "who": who,
+                    "exception": e,
+                    "traceback": traceback.format_exc(),
+                }
+            )
+            return []
+
+    return inner
+
+
+@Stream.register_api()
+def isolate_failures(node, dead_letter=None, pipeline=False):
+    """Route elements which fail in a node to a dead letter stream
+
+    Normally an exception in a node propagates up to ``emit``, so the
+    caller gets it and the branches not yet updated never see the element.
+    With isolated failures the exception is caught at the node, a record of
+    the failure is emitted into ``dead_letter`` and the upstream node carries
+    on with its other downstream nodes. The success path only goes through
+    a ``try`` block.
+
+    Failures of downstream nodes surface in the ``update`` of this node, so
+    they are isolated here too unless they are isolated themselves. Only
+    synchronous failures are caught, exceptions raised by the futures of
+    asynchronous nodes still propagate.
+
+    Parameters
+    ----------
+    node : Stream instance
+        The node whose failures are isolated
+    dead_letter : Stream instance, optional
+        Receives a dict with the failing ``node``, the ``element``, the
+        upstream it came from (``who``), the ``exception`` and the formatted
+        ``traceback`` for every failure. Created if not given.
+    pipeline : bool, optional
+        If True isolate the failures of every node downstream of ``node``
+        as well, defaults to False
+
+    Returns
+    -------
+    Stream instance
+        The dead letter stream
+
+    Examples
+    --------
+    >>> source = Stream()
+    >>> dead = source.map(parse).sink(print).isolate_failures()
+    >>> dead.sink(log_failure)
+    """
+    if dead_letter is None:
+        dead_letter = Stream(stream_name="dead letters")
+    nodes = [node]
+    seen = set()
+    while nodes:
+        n = nodes.pop()
+        if n in seen:
+            continue
+        seen.add(n)
+        n.update = _isolated(n, n.update, dead_letter)
+        if pipeline:
+            nodes.extend(n.downstreams)
+    return dead_letter
+
+
+# the attributes which can be replaced in running pipelines
+_swappable = ("func", "predicate", "args", "kwargs")
+
+
+@Stream.register_api()
+def swap(node, **changes):
+    """Replace the function or arguments of a node in a running pipeline
+
+    All changes are applied at once, with a single update of the node's
+    attributes, so every element sees either the old or the new function
+    and arguments together while the state of the pipeline is kept. For
+    nodes with an event loop the change is made on the loop, between two
+    elements. Elements already submitted by parallel nodes finish with the
+    old function. Parallel nodes with synchronous clients which support
+    ``run`` (eg dask) load new functions on the workers before swapping them
+    in, asynchronous clients ship them with the next tasks.
+
+    Parameters
+    ----------
+    node : Stream instance
+        A ``map``, ``starmap``, ``filter`` or ``starsink`` node, or their
+        parallel counterparts
+    func, predicate, args, kwargs : optional
+        The new values of the node attributes
+
+    Returns
+    -------
+    Stream instance
+        The node
+
+    Examples
+    --------
+    >>> source = Stream()
+    >>> total = source.map(inc).accumulate(add)
+    >>> total.upstreams[0].swap(func=dec)
+    """
+    for k in changes:
+        if k not in _swappable or not hasattr(node, k):
+            raise ValueError(
+                "{} can not swap {!r}, only {}".format(
+                    type(node).__name__,
+                    k,
+                    [a for a in _swappable if hasattr(node, a)],
+                )
+            )
+    if "args" in changes:
+        changes["args"] = tuple(changes["args"])
+    prepare = getattr(node, "_prepare_swap", None)
+    if prepare is not None:
+        changes = prepare(changes)
+
+    def apply():
+        vars(node).update(changes)
+
+    loop = getattr(node, "loop", None)
+    if loop is None or _in_loop_thread(loop) or not _is_running(loop):
+        # no element can be in flight on the loop
+        apply()
+    else:
+        done = threading.Event()
+
+        def apply_on_loop():
+            try:
+                apply()
+            finally:
+                done.set()
+
+        loop.add_callback(apply_on_loop)
+        done.wait()
+    return node
+
+
+def _is_running(loop):
+    asyncio_loop = getattr(loop, "asyncio_loop", None)
+    if asyncio_loop is None:
+        # tornado < 5
+        return getattr(loop, "_running", True)
+    return asyncio_loop.is_running()
+
+
+def _in_loop_thread(loop):
+    """Whether the caller runs on the thread of a running loop"""
+    asyncio_loop = getattr(loop, "asyncio_loop", None)
+    if asyncio_loop is None:
+        # tornado < 5
+        return IOLoop.current(instance=False) is loop
+    return asyncio._get_running_loop() is asyncio_loop
+
+
 @Stream.register_api()
 class combine_latest(_combine_latest):
     """ Combine multiple streams together to a stream of tuples
@@ -237,9 +666,25 @@ class zip(_zip):
         first = kwargs.pop("first", None)
 
         _zip.__init__(self, *upstreams, **kwargs)
+        self.arrivals = {upstream: deque() for upstream in self.buffers}
+        self.high_water = 0
         if first:
             move_to_first(self, first)
 
+    def update(self, x, who=None):
+        self.arrivals[who].append(time())
+        self.high_water = max(self.high_water, len(self.buffers[who]) + 1)
+        ret = _zip.update(self, x, who)
+        for upstream, arrivals in self.arrivals.items():
+            while len(arrivals) > len(self.buffers[upstream]):
+                arrivals.popleft()
+        return ret
+
+    def backlog_stats(self):
+        """The backlog of the most filled upstream buffer"""
+        arrivals = max(self.arrivals.values(), key=len)
+        return backlog_stats(arrivals, self.high_water)
+
 
 @Stream.register_api()
 class zip_latest(_zip_latest):
@@ -268,9 +713,195 @@ class zip_latest(_zip_latest):
         first = kwargs.pop("first", None)
 
         _zip_latest.__init__(self, *upstreams, **kwargs)
+        self.arrivals = deque()
+        self.high_water = 0
         if first:
             move_to_first(self, first)
 
+    def update(self, x, who=None):
+        if who is self.lossless:
+            self.arrivals.append(time())
+            self.high_water = max(
+                self.high_water, len(self.lossless_buffer) + 1
+            )
+        ret = _zip_latest.update(self, x, who)
+        while len(self.arrivals) > len(self.lossless_buffer):
+            self.arrivals.popleft()
+        return ret
+
+    def backlog_stats(self):
+        """The backlog of the lossless buffer"""
+        return backlog_stats(self.arrivals, self.high_water)
+
+
+@Stream.register_api()
+class buffer(_buffer):
+    """ Allow results to pile up at this point in the stream
+
+    This allows results to buffer in place at various points in the stream.
+    This can help to smooth flow through the system when backpressure is
+    applied.
+    """
+
+    def __init__(self, upstream, n, **kwargs):
+        self.arrivals = deque()
+        self.high_water = 0
+        _buffer.__init__(self, upstream, n, **kwargs)
+
+    def update(self, x, who=None):
+        self.arrivals.append(time())
+        self.high_water = max(self.high_water, len(self.arrivals))
+        return self.queue.put(x)
+
+    @gen.coroutine
+    def cb(self):
+        while True:
+            x = yield self.queue.get()
+            self.arrivals.popleft()
+            yield self._emit(x)
+
+    def backlog_stats(self):
+        """The backlog of elements waiting in (or to be put into) the buffer
+        """
+        return backlog_stats(self.arrivals, self.high_water)
+
+
+_nothing = object()
+
+
+@Stream.register_api()
+class shed(Stream):
+    """ Shed load when the backlog downstream grows
+
+    The backlog of the watched nodes (anything with ``backlog_stats``, like
+    ``buffer``, ``zip`` or ``ParallelStream`` nodes with futures in flight)
+    decides what happens to every element:
+
+    * up to ``target`` everything passes
+    * above ``target`` only every k-th element passes, where k is the
+      backlog divided by ``target`` (rounded up)
+    * above ``latest`` elements are held back and only the most recent one
+      is kept
+
+    The held element is emitted as soon as the backlog is back at
+    ``target``, it is checked every ``interval`` seconds. All elements are
+    emitted on the event loop, so downstream nodes see them one at a time
+    and in order.
+
+    Parameters
+    ----------
+    target : int
+        The backlog which is handled without shedding
+    watch : Stream instance or list of Stream instances, optional
+        The nodes whose backlogs are summed, defaults to every node with
+        ``backlog_stats`` downstream of this one when the first element
+        arrives. Nodes added downstream later are not watched.
+    latest : int, optional
+        The backlog above which only the latest element is kept, defaults to
+        four times ``target``
+    interval : float or str, optional
+        Seconds between checks for a held element, defaults to 0.05
+
+    Examples
+    --------
+    >>> source.shed(10).scatter().map(render).buffer(100).gather().sink(show)
+    """
+
+    _graphviz_shape = "diamond"
+
+    def __init__(
+        self,
+        upstream,
+        target,
+        watch=None,
+        latest=None,
+        interval=0.05,
+        **kwargs
+    ):
+        self.target = target
+        if isinstance(watch, Stream):
+            watch = [watch]
+        self.watch = watch
+        self._watched_nodes = None
+        self.latest = latest if latest is not None else 4 * target
+        self.interval = convert_interval(interval)
+        self.mode = "pass"
+        self.dropped = 0
+        self.held = _nothing
+        self._count = 0
+        self._flushing = False
+        self._lock = threading.Lock()
+        Stream.__init__(self, upstream, ensure_io_loop=True, **kwargs)
+
+    def _watched(self):
+        if self.watch is not None:
+            return self.watch
+        if self._watched_nodes is None:
+            # found once, when the first element arrives
+            seen = set()
+            stack = list(self.downstreams)
+            while stack:
+                n = stack.pop()
+                if n in seen:
+                    continue
+                seen.add(n)
+                stack.extend(n.downstreams)
+            self._watched_nodes = [
+                n for n in seen if hasattr(n, "backlog_stats")
+            ]
+        return self._watched_nodes
+
+    def backlog(self):
+        """The summed backlog of the watched nodes"""
+        return sum(n.backlog_stats()["backlog"] for n in self._watched())
+
+    def update(self, x, who=None):
+        backlog = self.backlog()
+        with self._lock:
+            if self.held is not _nothing:
+                # the held element is superseded
+                self.dropped += 1
+                self.held = _nothing
+            if backlog <= self.target:
+                self.mode = "pass"
+            elif backlog > self.latest:
+                self.mode = "latest"
+                self.held = x
+                if not self._flushing:
+                    self._flushing = True
+                    self.loop.add_callback(self._flush)
+                return []
+            else:
+                self.mode = "decimate"
+                self._count += 1
+                if self._count % -(-backlog // self.target):
+                    self.dropped += 1
+                    return []
+        if _in_loop_thread(self.loop) or not _is_running(self.loop):
+            return self._emit(x)
+        # the held element is emitted on the loop, so everything is
+        return sync(self.loop, self._emit_on_loop, x)
+
+    @gen.coroutine
+    def _emit_on_loop(self, x):
+        result = yield self._emit(x)
+        raise gen.Return(result)
+
+    @gen.coroutine
+    def _flush(self):
+        while True:
+            yield gen.sleep(self.interval)
+            if self.held is not _nothing and self.backlog() > self.target:
+                continue
+            with self._lock:
+                x, self.held = self.held, _nothing
+                self._flushing = False
+                if x is not _nothing:
+                    self.mode = "pass"
+            if x is not _nothing:
+                yield self._emit(x)
+            return
+
 
 def destroy_pipeline(source_node: Stream):
     """Destroy all the nodes attached to the source
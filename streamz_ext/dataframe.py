@@ -1 +1,314 @@
+import warnings
+
+import numpy as np
+import pandas as pd
 from zstreamz.dataframe import *
+from zstreamz.dataframe.aggregations import GroupbyAggregation
+from zstreamz.dataframe.core import WindowedGroupBy
+
+_aggregations = (
+    "count",
+    "sum",
+    "mean",
+    "var",
+    "std",
+    "min",
+    "max",
+    "quantile",
+)
+
+
+class _GroupState(object):
+    """Per group running statistics held in numpy arrays
+
+    Groups get integer codes in order of appearance, row ``g`` of every
+    array holds the statistics of group ``g`` for each value column. Means
+    and variances are merged with Chan's parallel algorithm, quantiles are
+    estimated from a per group reservoir sample.
+    """
+
+    def __init__(self, columns, q=(), ddof=1, reservoir=1024):
+        self.columns = list(columns)
+        self.q = list(q)
+        self.ddof = ddof
+        self.reservoir = reservoir
+        self.index = None
+        self.n_groups = 0
+        self.rng = np.random.default_rng()
+        shape = (16, len(self.columns))
+        self.count = np.zeros(shape)
+        self.sum = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.samples = None
+        if self.q:
+            # the samples grow up to the reservoir size as values arrive
+            self.samples = np.full(shape + (min(8, reservoir),), np.nan)
+
+    def _grow(self, n):
+        capacity = len(self.count)
+        if n <= capacity:
+            return
+        extra = max(n, 2 * capacity) - capacity
+        for name, fill in [
+            ("count", 0),
+            ("sum", 0),
+            ("mean", 0),
+            ("m2", 0),
+            ("min", np.inf),
+            ("max", -np.inf),
+            ("samples", np.nan),
+        ]:
+            a = getattr(self, name)
+            if a is not None:
+                pad = np.full((extra,) + a.shape[1:], fill, dtype=a.dtype)
+                setattr(self, name, np.concatenate([a, pad]))
+
+    def _grow_samples(self, n):
+        capacity = self.samples.shape[2]
+        if n <= capacity:
+            return
+        extra = min(max(n, 2 * capacity), self.reservoir) - capacity
+        pad = np.full(self.samples.shape[:2] + (extra,), np.nan)
+        self.samples = np.concatenate([self.samples, pad], axis=2)
+
+    def _codes(self, keys):
+        """Codes of the groups in the batch, local and global"""
+        codes, uniques = pd.factorize(keys)
+        if self.index is None:
+            self.index = uniques[:0]
+        groups = self.index.get_indexer(uniques)
+        new = groups == -1
+        if new.any():
+            n_new = int(new.sum())
+            groups[new] = np.arange(self.n_groups, self.n_groups + n_new)
+            self.index = self.index.append(uniques[new])
+            self.n_groups += n_new
+            self._grow(self.n_groups)
+        return codes, groups
+
+    def _sample(self, j, groups, codes, x, counts, prior):
+        """Reservoir sampling (algorithm R) of a batch, vectorized"""
+        order = np.argsort(codes, kind="stable")
+        codes, x = codes[order], x[order]
+        starts = np.cumsum(counts) - counts
+        # how many values of the group came before each value
+        rank = prior[codes] + np.arange(len(codes)) - starts[codes]
+        slot = np.where(
+            rank < self.reservoir, rank, self.rng.integers(0, rank + 1)
+        )
+        keep = slot < self.reservoir
+        if keep.any():
+            self._grow_samples(int(slot[keep].max()) + 1)
+        self.samples[groups[codes[keep]], j, slot[keep]] = x[keep]
+
+    def update(self, keys, values):
+        """Add a batch
+
+        Parameters
+        ----------
+        keys : pandas.Index
+            The group of each row
+        values : ndarray
+            The values, one column per value column, NaNs are skipped
+        """
+        codes, groups = self._codes(keys)
+        k = len(groups)
+        for j in range(values.shape[1]):
+            x = values[:, j]
+            valid = ~np.isnan(x)
+            c, x = codes[valid], x[valid]
+            n_b = np.bincount(c, minlength=k).astype("f8")
+            s_b = np.bincount(c, weights=x, minlength=k)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_b = s_b / n_b
+            m2_b = np.bincount(c, weights=(x - mean_b[c]) ** 2, minlength=k)
+            min_b = np.full(k, np.inf)
+            max_b = np.full(k, -np.inf)
+            np.minimum.at(min_b, c, x)
+            np.maximum.at(max_b, c, x)
+
+            g = groups
+            n_a = self.count[g, j]
+            if self.samples is not None:
+                self._sample(j, g, c, x, n_b.astype("i8"), n_a.astype("i8"))
+            present = n_b > 0
+            g, n_a, n_b = g[present], n_a[present], n_b[present]
+            n = n_a + n_b
+            delta = mean_b[present] - self.mean[g, j]
+            self.mean[g, j] += delta * n_b / n
+            self.m2[g, j] += m2_b[present] + delta ** 2 * n_a * n_b / n
+            self.count[g, j] = n
+            self.sum[g, j] += s_b[present]
+            self.min[g, j] = np.minimum(self.min[g, j], min_b[present])
+            self.max[g, j] = np.maximum(self.max[g, j], max_b[present])
+
+    def _aggregate(self, name, j):
+        n = self.n_groups
+        count = self.count[:n, j]
+        empty = count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if name == "count":
+                return [count.astype("i8")]
+            if name == "sum":
+                return [self.sum[:n, j]]
+            if name == "mean":
+                return [np.where(empty, np.nan, self.mean[:n, j])]
+            if name in ("var", "std"):
+                dof = count - self.ddof
+                var = np.where(dof > 0, self.m2[:n, j] / dof, np.nan)
+                return [np.sqrt(var) if name == "std" else var]
+            if name in ("min", "max"):
+                return [np.where(empty, np.nan, getattr(self, name)[:n, j])]
+        with warnings.catch_warnings():
+            # groups without values
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return list(np.nanquantile(self.samples[:n, j], self.q, axis=1))
+
+    def result(self, aggs, flat=False):
+        """The aggregations of all groups as a dataframe"""
+        names = []
+        for a in aggs:
+            if a == "quantile":
+                names.extend("{:g}%".format(100 * q) for q in self.q)
+            else:
+                names.append(a)
+        data = {}
+        for j, col in enumerate(self.columns):
+            values = [v for a in aggs for v in self._aggregate(a, j)]
+            for name, v in zip(names, values):
+                data[name if flat else (col, name)] = v
+        index = self.index if self.index is not None else pd.Index([])
+        return pd.DataFrame(data, index=index, columns=list(data))
+
+
+class GroupbyAgg(GroupbyAggregation):
+    """ Incremental groupby aggregation of several statistics at once
+
+    The state of every group is kept in numpy arrays and updated with
+    vectorized operations, so the cost of a batch depends on its size, not
+    on the history seen so far. Only growing (not windowed) aggregations
+    are supported.
+
+    Parameters
+    ----------
+    columns : label, list or None
+        The value columns, all numeric non grouping columns if None
+    grouper : label, list of labels or array like
+        The grouping columns or keys
+    aggs : list of str
+        Any of "count", "sum", "mean", "var", "std", "min", "max" and
+        "quantile"
+    q : list of float, optional
+        The quantiles for "quantile", defaults to the median
+    ddof : int, optional
+        Delta degrees of freedom of "var" and "std", defaults to 1
+    reservoir : int, optional
+        The per group sample size for quantiles, these are exact up to this
+        many values, defaults to 1024
+    """
+
+    def __init__(
+        self,
+        columns,
+        grouper=None,
+        aggs=("count", "mean"),
+        q=(0.5,),
+        ddof=1,
+        reservoir=1024,
+    ):
+        unknown = set(aggs) - set(_aggregations)
+        if unknown:
+            raise ValueError(
+                "Unknown aggregations {}, expected any of {}".format(
+                    sorted(unknown), _aggregations
+                )
+            )
+        super(GroupbyAgg, self).__init__(
+            columns,
+            grouper=grouper,
+            aggs=list(aggs),
+            q=list(q) if "quantile" in aggs else [],
+            ddof=ddof,
+            reservoir=reservoir,
+        )
+
+    def _keys(self, df, grouper):
+        """The group keys of the rows and the grouping columns"""
+        if isinstance(grouper, list) and all(g in df.columns for g in grouper):
+            return pd.MultiIndex.from_frame(df[grouper]), grouper
+        try:
+            if grouper in df.columns:
+                return pd.Index(df[grouper]), [grouper]
+        except TypeError:
+            # array like groupers are not hashable
+            pass
+        return pd.Index(np.asarray(grouper)), []
+
+    def _value_columns(self, df, by):
+        if self.columns is None:
+            return [
+                c
+                for c in df.select_dtypes("number").columns
+                if c not in by
+            ]
+        if isinstance(self.columns, list):
+            return self.columns
+        return [self.columns]
+
+    def initial(self, new, grouper=None):
+        if grouper is None:
+            grouper = self.grouper
+        _, by = self._keys(new.iloc[:0], grouper)
+        return _GroupState(
+            self._value_columns(new, by),
+            q=self.q,
+            ddof=self.ddof,
+            reservoir=self.reservoir,
+        )
+
+    def on_new(self, acc, new, grouper=None):
+        if grouper is None:
+            grouper = self.grouper
+        if len(new):
+            keys, _ = self._keys(new, grouper)
+            acc.update(keys, new[acc.columns].to_numpy(dtype="f8"))
+        flat = self.columns is not None and not isinstance(self.columns, list)
+        return acc, acc.result(self.aggs, flat=flat)
+
+
+def groupby_agg(groupby, aggs=("count", "mean"), **kwargs):
+    """Aggregate several statistics of a streaming groupby incrementally
+
+    Parameters
+    ----------
+    groupby : GroupBy
+        The groupby of a streaming dataframe, eg ``sdf.groupby('name')``,
+        windowed groupbys are not supported
+    aggs : list of str
+        Any of "count", "sum", "mean", "var", "std", "min", "max" and
+        "quantile"
+    kwargs :
+        ``q``, ``ddof`` and ``reservoir``, see ``GroupbyAgg``
+
+    Returns
+    -------
+    DataFrames
+        An updating dataframe indexed by group in order of appearance, the
+        columns are the aggregations (per value column if there are
+        several)
+
+    Examples
+    --------
+    >>> sdf = DataFrame(example=pd.DataFrame({'name': [], 'x': []}))
+    >>> groupby_agg(sdf.groupby('name').x, ['mean', 'std', 'quantile'],
+    ...             q=[0.5, 0.99])
+    """
+    if isinstance(groupby, WindowedGroupBy):
+        raise ValueError(
+            "Incremental aggregations can not drop old values, "
+            "windowed groupbys are not supported"
+        )
+    return groupby._accumulate(GroupbyAgg, aggs=aggs, **kwargs)
@@ -1,8 +1,12 @@
+"""Graphing utilities for pipelines
+
+networkx, matplotlib and grave are only imported when they are used so that
+importing this module stays cheap.
+"""
+import inspect
+from functools import wraps
 from weakref import ref
 
-import matplotlib.pyplot as plt
-import networkx as nx
-from grave import plot_network
 from zstreamz import combine_latest
 from zstreamz.graph import *
 from zstreamz.graph import _clean_text
@@ -72,7 +76,7 @@ def readable_graph(node, source_node=False):
         create_edge_label_graph(node, g)
     else:
         create_graph(node, g)
-    mapping = {k: "{}".format(g.node[k]["label"]) for k in g}
+    mapping = {k: "{}".format(g.nodes[k]["label"]) for k in g}
     idx_mapping = {}
     for k, v in mapping.items():
         if v in idx_mapping.keys():
@@ -86,6 +90,226 @@ def readable_graph(node, source_node=False):
     return rg, gg
 
 
+def layered_layout(graph):
+    """Position the nodes of a pipeline in layers by their depth
+
+    This runs in linear time, unlike the spectral or spring layouts, so it
+    can be used for large pipelines. Graphs with cycles are put in a single
+    layer.
+
+    Parameters
+    ----------
+    graph : nx.DiGraph
+        The graph to be laid out
+
+    Returns
+    -------
+    dict
+        The positions of the nodes
+    """
+    import networkx as nx
+    import numpy as np
+
+    if nx.is_directed_acyclic_graph(graph):
+        # the longest path from a source
+        depths = {}
+        for n in nx.topological_sort(graph):
+            depths[n] = max(
+                (depths[p] + 1 for p in graph.predecessors(n)), default=0
+            )
+        layers = [[] for _ in range(max(depths.values(), default=-1) + 1)]
+        for n, d in depths.items():
+            layers[d].append(n)
+    else:
+        layers = [list(graph)]
+    depth = max(len(layers) - 1, 1)
+    pos = {}
+    for i, layer in enumerate(layers):
+        for j, n in enumerate(layer):
+            pos[n] = np.array(
+                [(j + 0.5) / len(layer) - 0.5, 0.5 - i / depth]
+            )
+    return pos
+
+
+class CachedLayout(object):
+    """Layout which keeps the positions of nodes between calls
+
+    The full layout is only computed the first time, nodes added later are
+    placed next to their already positioned neighbors. Graphs with more than
+    ``max_nodes`` nodes use ``layered_layout`` instead of the more expensive
+    layouts.
+
+    Examples
+    --------
+    >>> gv = LiveGraphPlot(g, layout=CachedLayout("spring"))
+    """
+
+    # layouts which scale quadratically or worse with the number of nodes
+    expensive = ("spectral", "spring", "kamada_kawai")
+
+    def __init__(self, layout="spectral", max_nodes=500, seed=None):
+        """
+
+        Parameters
+        ----------
+        layout : string or callable, optional, default: "spectral"
+            The layout used to position all nodes, one of "layered" or the
+            layouts of ``LiveGraphPlot``
+        max_nodes : int, optional
+            The size above which expensive layouts are replaced by
+            ``layered_layout``, defaults to 500
+        seed : int, optional
+            Seed for the small offsets given to new nodes
+        """
+        import numpy as np
+
+        self.layout = layout
+        self.max_nodes = max_nodes
+        self.rng = np.random.default_rng(seed)
+        self.pos = {}
+
+    def reset(self):
+        """Forget the positions, the next call lays out the whole graph"""
+        self.pos.clear()
+
+    def _full_layout(self, graph):
+        import networkx as nx
+
+        layout = self.layout
+        if callable(layout):
+            return layout(graph)
+        if layout == "layered" or (
+            layout in self.expensive and len(graph) > self.max_nodes
+        ):
+            return layered_layout(graph)
+        return getattr(nx, "{}_layout".format(layout))(graph)
+
+    def _place(self, graph, new):
+        import numpy as np
+
+        placed = np.array(list(self.pos.values()))
+        scale = np.ptp(placed, axis=0).max() / np.sqrt(len(placed)) or 0.1
+        new = set(new)
+        while new:
+            positioned = {}
+            for n in new:
+                neighbors = [
+                    self.pos[m] for m in _neighbors(graph, n) if m in self.pos
+                ]
+                if neighbors:
+                    offset = self.rng.normal(0, scale / 2, 2)
+                    positioned[n] = np.mean(neighbors, axis=0) + offset
+            if not positioned:
+                # not connected to anything positioned
+                lo, hi = placed.min(axis=0), placed.max(axis=0)
+                positioned = {
+                    n: self.rng.uniform(lo, hi + scale) for n in new
+                }
+            self.pos.update(positioned)
+            new.difference_update(positioned)
+
+    def __call__(self, graph):
+        new = [n for n in graph if n not in self.pos]
+        if len(new) == len(graph):
+            self.pos = dict(self._full_layout(graph))
+        elif new:
+            self._place(graph, new)
+        return {n: self.pos[n] for n in graph}
+
+
+def _neighbors(graph, n):
+    """Predecessors and successors of a node"""
+    if graph.is_directed():
+        return list(graph.predecessors(n)) + list(graph.successors(n))
+    return list(graph.neighbors(n))
+
+
+def collapse_chains(graph, groups=None, chains=True):
+    """Collapse linear chains and groups of nodes into single nodes
+
+    A chain is a path where every node but the first has a single upstream
+    and every node but the last has a single downstream. The collapsed node
+    keeps the attributes (and key) of the first node of the chain.
+
+    Parameters
+    ----------
+    graph : nx.DiGraph
+        The graph of the pipeline
+    groups : dict, optional
+        Nodes (keys of ``graph``) by label to collapse into one node each,
+        eg the nodes of the sub-pipelines built by the functions passed to
+        ``link``
+    chains : bool, optional
+        If False only the groups are collapsed, defaults to True
+
+    Returns
+    -------
+    collapsed : nx.DiGraph
+        The collapsed graph, collapsed nodes have a ``members`` attribute
+    owner : dict
+        The node of the collapsed graph of every node of ``graph``
+    """
+    import networkx as nx
+
+    owner = {}
+    members = {}
+    for label, nodes in (groups or {}).items():
+        members[label] = list(nodes)
+        owner.update((n, label) for n in nodes)
+
+    def linked(u):
+        """The downstream continuing the chain of u"""
+        if u in owner or graph.out_degree(u) != 1:
+            return None
+        (v,) = graph.successors(u)
+        if v in owner or graph.in_degree(v) != 1:
+            return None
+        return v
+
+    for n in graph if chains else []:
+        if n in owner:
+            continue
+        preds = list(graph.predecessors(n))
+        if len(preds) == 1 and linked(preds[0]) == n:
+            # not the start of a chain
+            continue
+        chain = [n]
+        while linked(chain[-1]) is not None:
+            chain.append(linked(chain[-1]))
+        if len(chain) > 1:
+            members[n] = chain
+            owner.update((m, n) for m in chain)
+
+    collapsed = nx.DiGraph()
+    for n, attrs in graph.nodes.items():
+        o = owner.get(n, n)
+        if o in collapsed:
+            continue
+        if o not in members:
+            collapsed.add_node(o, **attrs)
+            continue
+        chain = members[o]
+        if o in graph:
+            attrs = dict(graph.nodes[o])
+            label = "{} ... {}".format(
+                attrs.get("label", o),
+                graph.nodes[chain[-1]].get("label", chain[-1]),
+            )
+        else:
+            attrs = {}
+            label = o
+        attrs.update(
+            label="{} ({} nodes)".format(label, len(chain)), members=chain
+        )
+        collapsed.add_node(o, **attrs)
+    for u, v, attrs in graph.edges(data=True):
+        ou, ov = owner.get(u, u), owner.get(v, v)
+        if ou != ov:
+            collapsed.add_edge(ou, ov, **attrs)
+    return collapsed, owner
+
+
 class LiveGraphPlot(object):
     """Live plotting of the zstreamz graph status"""
 
@@ -109,7 +333,8 @@ class LiveGraphPlot(object):
         layout : string or callable, optional, default: "spectral"
             Specifies the type of layout to use for plotting.
             It must be one of "spring", "circular", "random", "kamada_kawai",
-            "shell", "spectral", or a callable.
+            "shell", "spectral", "layered", or a callable. Positions are
+            cached between updates, see ``CachedLayout``.
         node_style : dict or callable, optional
             The style parameters for nodes, if callable must return a dict
         edge_style : dict or callable, optional
@@ -124,6 +349,9 @@ class LiveGraphPlot(object):
             If True force drawing every time graph is updated, else only draw
             when idle. Defaults to False
         """
+        import matplotlib.pyplot as plt
+        from grave import plot_network
+
         self.force_draw = force_draw
         if edge_label_style is None:
             edge_label_style = {}
@@ -137,6 +365,8 @@ class LiveGraphPlot(object):
         self.edge_style = edge_style
         self.node_label_style = node_label_style
         self.edge_label_style = edge_label_style
+        if not isinstance(layout, CachedLayout):
+            layout = CachedLayout(layout)
         self.layout = layout
         self.graph = graph
         if not ax:
@@ -155,7 +385,9 @@ class LiveGraphPlot(object):
 
     def update(self):
         """Update the graph plot"""
-        # TODO: reuse the current node positions (if no new nodes added)
+        import matplotlib.pyplot as plt
+
+        # the cached layout only positions nodes added since the last update
         self.art._reprocess()
         if self.force_draw:
             plt.draw()
@@ -163,9 +395,29 @@ class LiveGraphPlot(object):
             self.ax.figure.canvas.draw_idle()
 
 
+def _method_node(func):
+    """The node of a bound node method, also through ``functools.wraps``
+    wrappers installed on top of it"""
+    method = inspect.unwrap(func, stop=lambda f: hasattr(f, "__self__"))
+    return method.__self__
+
+
+def _pass_through(target):
+    """A function calling ``target[0]``, so that what it calls can be swapped
+    out while it is wrapped by someone else"""
+
+    @wraps(target[0])
+    def installed(*args, **kwargs):
+        return target[0](*args, **kwargs)
+
+    return installed
+
+
 def decorate_nodes(graph, update_decorator=None, emit_decorator=None):
     """Decorate node methods for nodes in a graph
 
+    Plain ``Stream`` nodes are sources, only their ``_emit`` is decorated.
+
     Parameters
     ----------
     graph : nx.Graph instance
@@ -177,15 +429,49 @@ def decorate_nodes(graph, update_decorator=None, emit_decorator=None):
 
     Returns
     -------
-
+    dict
+        The installed method, the original method and the list holding the
+        decorator's wrapper by node and method name, to be passed to
+        ``undecorate_nodes``
     """
+    decorated = {}
     for n, attrs in graph.nodes.items():
         nn = attrs["node"]()
+        if nn is None:
+            continue
+        decorators = [("_emit", emit_decorator)]
         if nn.__class__ != Stream:
-            if update_decorator:
-                nn.update = update_decorator(attrs["node"]().update)
-            if emit_decorator:
-                nn._emit = emit_decorator(attrs["node"]()._emit)
+            decorators.insert(0, ("update", update_decorator))
+        for method, decorator in decorators:
+            if decorator:
+                original = getattr(nn, method)
+                target = [decorator(original)]
+                installed = _pass_through(target)
+                setattr(nn, method, installed)
+                decorated[nn, method] = (installed, original, target)
+    return decorated
+
+
+def undecorate_nodes(decorated):
+    """Restore the node methods decorated by ``decorate_nodes``
+
+    A method is only restored while the method installed by
+    ``decorate_nodes`` is still in place. Wrappers installed on top of it
+    later are left untouched, the decorator's wrapper beneath them is
+    replaced by the original method so it stops recording.
+
+    Parameters
+    ----------
+    decorated : dict
+        The result of ``decorate_nodes``
+    """
+    for (node, method), (installed, original, target) in decorated.items():
+        if node.__dict__.get(method) is not installed:
+            target[0] = original
+        elif getattr(original, "__func__", None) is getattr(type(node), method):
+            delattr(node, method)
+        else:
+            setattr(node, method, original)
 
 
 status_color_map = {"running": "yellow", "waiting": "green", "error": "red"}
@@ -199,7 +485,7 @@ def node_style(node_attrs):
     return d
 
 
-def run_vis(node, source_node=False, **kwargs):
+def run_vis(node, source_node=False, collapse=False, groups=None, **kwargs):
     """Start the visualization of a pipeline
 
     Parameters
@@ -209,6 +495,11 @@ def run_vis(node, source_node=False, **kwargs):
     source_node : bool
         If True the input node is the source node and numbers the
         graph edges accordingly, defaults to False
+    collapse : bool, optional
+        If True linear chains of nodes are shown as single nodes, see
+        ``collapse_chains``, defaults to False
+    groups : dict, optional
+        Lists of nodes by label which are shown as single nodes
     kwargs : Any
         kwargs passed to LiveGraphPlot
 
@@ -216,13 +507,23 @@ def run_vis(node, source_node=False, **kwargs):
     -------
 
     """
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
     g, gg = readable_graph(node, source_node=source_node)
+    owner = {}
+    if collapse or groups:
+        groups = {
+            label: [gg[hash(n)] for n in nodes]
+            for label, nodes in (groups or {}).items()
+        }
+        g, owner = collapse_chains(g, groups, chains=collapse)
     fig, ax = plt.subplots()
     gv = LiveGraphPlot(g, ax=ax, **kwargs)
 
     def update_decorator(func):
-        node = hash(func.__self__)
-        node_name = gg[node]
+        node = hash(_method_node(func))
+        node_name = owner.get(gg[node], gg[node])
 
         # @wraps
         def wrapps(*args, **kwargs):
@@ -242,8 +543,8 @@ def run_vis(node, source_node=False, **kwargs):
         return wrapps
 
     def emit_decorator(func):
-        node = hash(func.__self__)
-        node_name = gg[node]
+        node = hash(_method_node(func))
+        node_name = owner.get(gg[node], gg[node])
 
         def wrapps(*args, **kwargs):
             g.nodes[node_name]["status"] = "waiting"
@@ -1,4 +1,7 @@
 """Link pipelines together"""
+from copy import copy
+
+from .core import Stream
 
 
 def link(*args, **kwargs):
@@ -21,3 +24,104 @@ def link(*args, **kwargs):
         if new_namespace:
             namespace.update(**new_namespace)
     return namespace
+
+
+# node attributes which hold the state accumulated from the elements
+_state_attrs = [
+    "state",
+    "seen",
+    "non_hash_seen",
+    "buffer",
+    "buffers",
+    "last",
+    "missing",
+    "lossless_buffer",
+    "cache",
+    "next",
+    "arrivals",
+    "blocks",
+]
+
+
+def _copy_state(value):
+    if type(value) is dict:
+        return {k: copy(v) for k, v in value.items()}
+    return copy(value)
+
+
+def _snapshot(node):
+    snapshot = {}
+    for attr, value in vars(node).items():
+        if attr in _state_attrs:
+            empty = hasattr(value, "clear") and not len(value)
+            snapshot[attr] = (value, empty, _copy_state(value))
+    return snapshot
+
+
+def _restore(node, snapshot):
+    for attr, (original, empty, value) in snapshot.items():
+        # containers which the node keeps for its lifetime (like LRUs, which
+        # can not be copied) are cleared in place
+        if empty and getattr(node, attr) is original:
+            original.clear()
+        else:
+            setattr(node, attr, _copy_state(value))
+    queue = getattr(node, "queue", None)
+    if queue is not None:
+        while queue.qsize():
+            queue.get_nowait()
+
+
+class Template(object):
+    """Link pipelines once and reuse them by resetting their state
+
+    The pipeline functions are only called when the template is created,
+    ``reset`` clears the state of every node (accumulators, buffers, caches,
+    etc.) back to how it was when the pipeline was linked while keeping the
+    topology.
+
+    Examples
+    --------
+    >>> template = Template(make_a, make_b)
+    >>> for scan in scans:
+    ...     namespace = template.reset()
+    ...     for doc in scan:
+    ...         namespace["source"].emit(doc)
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+
+        Parameters
+        ----------
+        args : funcs
+            Functions which take in nodes and kwargs and return a dict
+        kwargs : Any
+            The input namespace which is passed to the pipeline functions
+        """
+        import networkx as nx
+        from .graph import create_graph_nodes
+
+        self.namespace = link(*args, **kwargs)
+        graph = nx.DiGraph()
+        for v in self.namespace.values():
+            if isinstance(v, Stream) and hash(v) not in graph:
+                create_graph_nodes(v, graph)
+        self.snapshots = [
+            (attrs["node"], _snapshot(attrs["node"]()))
+            for n, attrs in graph.nodes.items()
+        ]
+
+    def reset(self):
+        """Reset the state of every node in the pipeline
+
+        Returns
+        -------
+        dict
+            The linked namespace
+        """
+        for ref, snapshot in self.snapshots:
+            node = ref()
+            if node is not None:
+                _restore(node, snapshot)
+        return self.namespace
@@ -0,0 +1,378 @@
+"""Monitoring of running pipelines"""
+from collections import deque
+from collections.abc import Mapping
+import sys
+import threading
+import time
+import traceback
+
+import networkx as nx
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from .core import Stream
+from .graph import create_graph_nodes, readable_graph
+
+
+def _pipeline_nodes(node):
+    """The nodes of a pipeline in topological order with readable names
+
+    Parameters
+    ----------
+    node : Stream instance
+        A node in the pipeline
+
+    Returns
+    -------
+    list of tuple
+        The ``(name, weakref)`` pairs of every node, upstream nodes first
+    """
+    g, names = readable_graph(node)
+    node_g = nx.DiGraph()
+    create_graph_nodes(node, node_g)
+    return [
+        (names[n].strip(), node_g.nodes[n]["node"])
+        for n in nx.topological_sort(node_g)
+    ]
+
+
+def backlog_report(node):
+    """Poll the backlog of every node in a pipeline which holds elements
+
+    Parameters
+    ----------
+    node : Stream instance
+        A node in the pipeline
+
+    Returns
+    -------
+    dict
+        The ``backlog_stats`` of every ``buffer``, ``zip``, ``zip_latest``
+        and ``ParallelStream`` node keyed by node name, upstream nodes first
+    """
+    report = {}
+    for name, ref in _pipeline_nodes(node):
+        n = ref()
+        if n is not None and hasattr(n, "backlog_stats"):
+            report[name] = n.backlog_stats()
+    return report
+
+
+def _is_remote_future(x):
+    # dask futures hold their data on the workers
+    return type(x).__module__.startswith("distributed") and hasattr(
+        x, "key"
+    )
+
+
+def _sizeof(x, seen, remote):
+    """Estimate the bytes held by an object
+
+    Containers are walked, numpy and pandas objects report their buffers
+    and finished local futures count their results. Dask futures are
+    appended to ``remote`` instead, their data lives on the workers.
+    """
+    if id(x) in seen or isinstance(x, Stream):
+        return 0
+    seen.add(id(x))
+    if _is_remote_future(x):
+        remote.append(x)
+        return sys.getsizeof(x)
+    memory_usage = getattr(x, "memory_usage", None)
+    if callable(memory_usage):
+        # pandas
+        try:
+            usage = memory_usage(deep=True)
+            return int(getattr(usage, "sum", lambda: usage)())
+        except TypeError:
+            pass
+    nbytes = getattr(x, "nbytes", None)
+    if isinstance(nbytes, int):
+        # numpy arrays, views only count their header
+        size = sys.getsizeof(x)
+        if getattr(x, "base", None) is not None or size >= nbytes:
+            return size
+        return size + nbytes
+    if hasattr(x, "done") and hasattr(x, "result"):
+        size = sys.getsizeof(x)
+        if x.done() and not x.cancelled() and x.exception() is None:
+            size += _sizeof(x.result(), seen, remote)
+        return size
+    size = sys.getsizeof(x)
+    if isinstance(x, (str, bytes, bytearray)):
+        return size
+    if isinstance(x, Mapping):
+        items = list(x.items())
+        return size + sum(
+            _sizeof(k, seen, remote) + _sizeof(v, seen, remote)
+            for k, v in items
+        )
+    if isinstance(x, (list, tuple, set, frozenset, deque)):
+        return size + sum(_sizeof(v, seen, remote) for v in list(x))
+    # queues of ``buffer`` nodes
+    queue = getattr(x, "_queue", None)
+    if isinstance(queue, deque):
+        return size + _sizeof(queue, seen, remote)
+    return size
+
+
+def _remote_nbytes(futures):
+    """The bytes held on the workers for dask futures"""
+    total = 0
+    by_client = {}
+    for f in futures:
+        by_client.setdefault(f.client, set()).add(f.key)
+    for client, keys in by_client.items():
+        if getattr(client, "asynchronous", False):
+            # the result would be a coroutine which can not be waited on here
+            continue
+        try:
+            nbytes = client.nbytes(keys=list(keys), summary=False)
+        except Exception:
+            # the client is gone
+            continue
+        if isinstance(nbytes, Mapping):
+            total += sum(nbytes.get(k, 0) for k in keys)
+    return total
+
+
+def node_nbytes(node):
+    """Estimate the memory held by the state of a node
+
+    Parameters
+    ----------
+    node : Stream instance
+
+    Returns
+    -------
+    dict
+        The ``nbytes`` held locally and the ``remote_nbytes`` held by dask
+        workers for the futures the node references
+    """
+    seen = set()
+    remote = []
+    local = sum(
+        _sizeof(v, seen, remote)
+        for k, v in list(vars(node).items())
+        if k not in ["upstreams", "downstreams", "loop"]
+    )
+    return {"nbytes": local, "remote_nbytes": _remote_nbytes(remote)}
+
+
+def memory_report(node):
+    """Estimate the memory held by every node in a pipeline
+
+    Buffers, windows, caches (like ``unique.seen``), accumulated state and
+    futures are all counted. Data shared between nodes is counted for every
+    node holding it.
+
+    Parameters
+    ----------
+    node : Stream instance
+        A node in the pipeline
+
+    Returns
+    -------
+    dict
+        The ``node_nbytes`` of every node keyed by node name, upstream nodes
+        first
+    """
+    report = {}
+    for name, ref in _pipeline_nodes(node):
+        n = ref()
+        if n is not None:
+            report[name] = node_nbytes(n)
+    return report
+
+
+class BacklogMonitor(object):
+    """Track the backlogs of a pipeline between polls
+
+    Examples
+    --------
+    >>> monitor = BacklogMonitor(source)
+    >>> monitor.poll()
+    >>> # some time later
+    >>> monitor.bottleneck()
+    'buffer'
+    """
+
+    def __init__(self, node):
+        """
+
+        Parameters
+        ----------
+        node : Stream instance
+            A node in the pipeline
+        """
+        self.nodes = [
+            (name, ref)
+            for name, ref in _pipeline_nodes(node)
+            if hasattr(ref(), "backlog_stats")
+        ]
+        self.last = {}
+
+    def poll(self, memory=False):
+        """Poll the backlog of every node
+
+        Parameters
+        ----------
+        memory : bool, optional
+            If True also report the memory held by every node (see
+            ``node_nbytes``), defaults to False
+
+        Returns
+        -------
+        dict
+            The ``backlog_stats`` of every node keyed by node name, upstream
+            nodes first. The ``growth`` entry holds the change in backlog
+            since the previous poll.
+        """
+        report = {}
+        for name, ref in self.nodes:
+            n = ref()
+            if n is None:
+                continue
+            stats = n.backlog_stats()
+            stats["growth"] = stats["backlog"] - self.last.get(
+                name, {}
+            ).get("backlog", 0)
+            if memory:
+                stats.update(node_nbytes(n))
+            report[name] = stats
+        self.last = report
+        return report
+
+    def bottleneck(self):
+        """Name the node where the queues start growing
+
+        Backpressure makes queues grow upstream of the slowest part of the
+        pipeline, starting right in front of it, so this is the most
+        downstream node whose backlog grew since the previous poll.
+
+        Returns
+        -------
+        str or None
+            The node name, None if no backlog is growing
+        """
+        growing = [
+            name for name, stats in self.poll().items() if stats["growth"] > 0
+        ]
+        if growing:
+            return growing[-1]
+
+
+def _active_node(frame):
+    """The innermost node running ``update`` in a stack"""
+    while frame is not None:
+        node = frame.f_locals.get("self")
+        if frame.f_code.co_name == "update" and isinstance(node, Stream):
+            return node
+        frame = frame.f_back
+
+
+class LoopLagMonitor(object):
+    """Find the nodes which block an event loop
+
+    A heartbeat on the loop measures how late it runs. A watchdog thread
+    notices when the heartbeat stalls for longer than ``threshold`` and
+    captures the stack of the loop thread along with the node whose
+    ``update`` is running.
+
+    Examples
+    --------
+    >>> monitor = LoopLagMonitor(source, threshold=0.2)
+    >>> monitor.start()
+    >>> # some time later
+    >>> monitor.events[0]['node']
+    <map: load_image>
+    """
+
+    def __init__(self, node=None, threshold=0.1, interval=0.02, loop=None):
+        """
+
+        Parameters
+        ----------
+        node : Stream instance, optional
+            A node of the pipeline, its loop is monitored
+        threshold : float, optional
+            The lag in seconds which counts as blocking, defaults to 0.1
+        interval : float, optional
+            Seconds between heartbeats, defaults to 0.02
+        loop : IOLoop, optional
+            The loop to monitor, defaults to the loop of ``node`` or the
+            current loop
+        """
+        if loop is None:
+            loop = getattr(node, "loop", None) or IOLoop.current()
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.lags = deque(maxlen=1000)
+        self.max_lag = 0.0
+        self.events = []
+        self.running = False
+        self._beat = None
+        self._beats = 0
+        self._thread_id = None
+        self._watchdog = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """Start the heartbeat and the watchdog"""
+        self.running = True
+        self._beat = time.time()
+        self.loop.add_callback(self._heartbeat)
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        """Stop monitoring"""
+        self.running = False
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    @gen.coroutine
+    def _heartbeat(self):
+        self._thread_id = threading.get_ident()
+        while self.running:
+            start = time.time()
+            self._beat = start
+            self._beats += 1
+            yield gen.sleep(self.interval)
+            lag = max(time.time() - start - self.interval, 0.0)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self):
+        reported = None
+        while self.running:
+            time.sleep(self.interval / 2)
+            stalled = time.time() - self._beat - self.interval
+            if (
+                stalled < self.threshold
+                or reported == self._beats
+                or self._thread_id is None
+            ):
+                continue
+            # only one event per stall
+            reported = self._beats
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.events.append(
+                {
+                    "time": time.time(),
+                    "lag": stalled,
+                    "node": _active_node(frame),
+                    "stack": "".join(traceback.format_stack(frame)),
+                }
+            )
+            del frame
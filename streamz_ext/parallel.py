@@ -1,16 +1,21 @@
-from concurrent.futures import Future
+from collections import deque
+from concurrent.futures import Executor, Future
 from functools import wraps
+import mmap
+import os
+import threading
+from time import time
 
 from streamz_ext import apply
 from zstreamz.core import _truthy, args_kwargs
 from streamz_ext.core import get_io_loop
-from streamz_ext.clients import DEFAULT_BACKENDS
+from streamz_ext.clients import DEFAULT_BACKENDS, _supports_priority
 from operator import getitem
 
 from tornado import gen
 
 from . import core, sources
-from .core import Stream
+from .core import Stream, apply_batched, backlog_stats
 
 from collections import Sequence
 from toolz import pluck as _pluck
@@ -43,6 +48,157 @@ def filter_null_wrapper(func):
     return inner
 
 
+def _null_predicate(predicate):
+    if predicate is None:
+        predicate = _truthy
+    return return_null(predicate)
+
+
+def _loaded(*funcs):
+    """Run on the workers, unpickling the functions imports their modules"""
+    return True
+
+
+def _line_chunks(path, chunk_size, delimiter=b"\n"):
+    """Split a file into byte ranges which end on a delimiter
+
+    Parameters
+    ----------
+    path : str
+        The file to be split
+    chunk_size : int
+        The minimum number of bytes in each range, ranges are extended to
+        the next delimiter
+    delimiter : bytes, optional
+        The line delimiter, defaults to ``b"\\n"``
+
+    Returns
+    -------
+    list of tuple
+        The ``(start, stop)`` byte offsets of each range
+    """
+    ranges = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return ranges
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                stop = mm.find(delimiter, start + chunk_size - 1)
+                if stop == -1:
+                    stop = size
+                else:
+                    stop += len(delimiter)
+                ranges.append((start, stop))
+                start = stop
+    return ranges
+
+
+def _read_line_chunk(
+    path, start, stop, parse=None, delimiter="\n", encoding="utf-8"
+):
+    """Read the lines in a byte range of a file, optionally parsing them"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[start:stop]
+    parts = data.decode(encoding).split(delimiter)
+    lines = [part + delimiter for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    if parse is not None:
+        lines = [parse(line) for line in lines]
+    return lines
+
+
+def _apply_batched(
+    func, batch, stack=True, args=(), kwargs=None, drop_null=False
+):
+    """``apply_batched`` which skips filtered elements, keeping them in
+    place so that the results line up with the batch unless ``drop_null``
+    """
+    keep = [
+        i
+        for i, x in enumerate(batch)
+        if not (isinstance(x, str) and x == NULL_COMPUTE)
+    ]
+    results = [NULL_COMPUTE] * len(batch)
+    if keep:
+        computed = apply_batched(
+            func, [batch[i] for i in keep], stack, args, kwargs
+        )
+        # ``zip`` is shadowed by the node below
+        for j, i in enumerate(keep):
+            results[i] = computed[j]
+    if drop_null:
+        return [results[i] for i in keep]
+    return results
+
+
+def _combine(func, a, b, kwargs):
+    # filtered elements drop out of the reduction
+    if isinstance(a, str) and a == NULL_COMPUTE:
+        return b
+    if isinstance(b, str) and b == NULL_COMPUTE:
+        return a
+    return func(a, b, **kwargs)
+
+
+def _unless_null(x, result):
+    if isinstance(x, str) and x == NULL_COMPUTE:
+        return NULL_COMPUTE
+    return result
+
+
+def _tree_reduce(client, func, futures, kwargs=None):
+    """Reduce futures with an associative binary function as a balanced
+    tree of tasks
+
+    Parameters
+    ----------
+    client : Client like
+        The backend to submit the tasks to
+    func : callable
+        The associative binary function
+    futures : list
+        The futures (or data) to reduce, in order
+    kwargs : dict, optional
+        Keyword arguments for ``func``
+
+    Returns
+    -------
+    future
+        The reduction, ``NULL_COMPUTE`` if every element was filtered
+    """
+    kwargs = kwargs or {}
+    level = list(futures)
+    while len(level) > 1:
+        nxt = [
+            client.submit(_combine, func, level[i], level[i + 1], kwargs)
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0]
+
+
+class _PrioritizedClient(object):
+    """Client proxy which submits every task with a priority"""
+
+    def __init__(self, client, priority):
+        self.client = client
+        self.priority = priority
+
+    def submit(self, func, *args, **kwargs):
+        return self.client.submit(
+            func, *args, priority=self.priority, **kwargs
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
 class ParallelStream(Stream):
     """ A Parallel stream using multiple backends
 
@@ -78,13 +234,36 @@ class ParallelStream(Stream):
     >>> source = Stream()
     >>> (source.scatter(backend=distributed.default_client).map(func).accumulate(binop).gather().sink(...))
 
+    Tasks can be given a ``priority``, passed through to ``submit`` of the
+    client, higher priorities run first. Nodes inherit the priority of their
+    upstream nodes, so setting it on ``scatter`` sets it for a branch. Only
+    the dask and thread backends support priorities, other backends raise a
+    ``ValueError``. On the thread backend a task runs at the lowest priority
+    of its unfinished inputs, so that it never takes a worker while waiting
+    on them.
+    >>> preview = source.scatter(backend='thread', priority=10).map(func)
+
     See Also
     --------
     dask.distributed.Client
     """
 
-    def __init__(self, *args, backend="dask", **kwargs):
+    # how ``__init__`` wraps the swappable attributes
+    _swap_wrappers = {}
+
+    def __init__(self, *args, backend="dask", priority=None, **kwargs):
+        # submission times of the emitted futures which are not done
+        self.outstanding = {}
+        self.outstanding_high_water = 0
         super().__init__(*args, **kwargs)
+        if priority is None:
+            priorities = [
+                u.priority
+                for u in self.upstreams
+                if getattr(u, "priority", None) is not None
+            ]
+            priority = max(priorities) if priorities else None
+        self.priority = priority
         upstream_backends = set(
             [getattr(u, "default_client", None) for u in self.upstreams]
         )
@@ -96,9 +275,13 @@ class ParallelStream(Stream):
             self.default_client = upstream_backends.pop()
         else:
             self.default_client = DEFAULT_BACKENDS.get(backend, backend)
-        if "loop" not in kwargs and getattr(
-            self.default_client(), "loop", None
-        ):
+        client = self.default_client()
+        if priority is not None and not _supports_priority(client):
+            raise ValueError(
+                "{} does not support task priorities, use the dask or "
+                "thread backend".format(type(client).__name__)
+            )
+        if "loop" not in kwargs and getattr(client, "loop", None):
             loop = self.default_client().loop
             self._set_loop(loop)
             if kwargs.get("ensure_io_loop", False) and not self.loop:
@@ -106,6 +289,61 @@ class ParallelStream(Stream):
             if self.loop is None and self.asynchronous is not None:
                 self._set_loop(get_io_loop(self.asynchronous))
 
+    def _prepare_swap(self, changes):
+        """Wrap new functions like ``__init__`` does and load them on the
+        workers of synchronous clients before they are swapped in"""
+        for k, wrapper in self._swap_wrappers.items():
+            if k in changes:
+                changes[k] = wrapper(changes[k])
+        funcs = [changes[k] for k in ["func", "predicate"] if k in changes]
+        client = self.default_client()
+        # the ``run`` of asynchronous clients could only be waited on from
+        # their loop, there the functions are shipped with the next tasks
+        if (
+            funcs
+            and hasattr(client, "run")
+            and not getattr(client, "asynchronous", False)
+        ):
+            client.run(_loaded, *funcs)
+        return changes
+
+    def _client(self):
+        """The client to submit tasks with, passing on the priority"""
+        client = self.default_client()
+        if self.priority is None:
+            return client
+        return _PrioritizedClient(client, self.priority)
+
+    def _emit(self, x):
+        if hasattr(x, "add_done_callback") and not x.done():
+            key = id(x)
+            self.outstanding[key] = time()
+            self.outstanding_high_water = max(
+                self.outstanding_high_water, len(self.outstanding)
+            )
+            x.add_done_callback(lambda _: self.outstanding.pop(key, None))
+        return super()._emit(x)
+
+    def backlog_stats(self):
+        """The backlog of emitted futures which are not done, combined with
+        any elements buffered by the node"""
+        stats = backlog_stats(
+            list(self.outstanding.values()), self.outstanding_high_water
+        )
+        buffered = getattr(super(), "backlog_stats", None)
+        if buffered is not None:
+            buffered = buffered()
+            stats = {
+                "backlog": stats["backlog"] + buffered["backlog"],
+                "oldest_age": max(
+                    stats["oldest_age"], buffered["oldest_age"]
+                ),
+                "high_water": max(
+                    stats["high_water"], buffered["high_water"]
+                ),
+            }
+        return stats
+
 
 @args_kwargs
 @core.Stream.register_api()
@@ -114,11 +352,88 @@ class scatter(ParallelStream):
     @gen.coroutine
     def update(self, x, who=None):
         client = self.default_client()
-        future = yield client.scatter(x, asynchronous=True)
+        kwargs = {}
+        if self.priority is not None and isinstance(client, Executor):
+            # scattering runs as a task on executors, the tasks downstream
+            # can not run before it
+            kwargs["priority"] = self.priority
+        future = yield client.scatter(x, asynchronous=True, **kwargs)
         f = yield self._emit(future)
         raise gen.Return(f)
 
 
+@args_kwargs
+@core.Stream.register_api()
+@ParallelStream.register_api()
+class read_chunks(ParallelStream):
+    """ Read files as chunks of lines on the backend
+
+    Each incoming element is a path (for instance from ``filenames``). The
+    file is memory mapped, split into byte ranges of at least ``chunk_size``
+    bytes which end on line boundaries, and each range is submitted to the
+    backend. Every emitted future holds the list of lines in one chunk, in
+    file order. The files must be readable from the workers.
+
+    Parameters
+    ----------
+    chunk_size : int, optional
+        The minimum number of bytes in each chunk, defaults to 64 MiB
+    parse : callable, optional
+        Function applied to every line on the worker, if None the raw lines
+        are returned
+    delimiter : str, optional
+        The line delimiter, defaults to ``"\\n"``
+    encoding : str, optional
+        The file encoding, defaults to ``"utf-8"``
+
+    Examples
+    --------
+    >>> source = Stream.filenames('path/to/logs/*.log')
+    >>> (source.read_chunks(parse=json.loads, backend='thread')
+    ...  .map(process_chunk).gather().sink(print))
+    """
+
+    def __init__(
+        self,
+        upstream,
+        chunk_size=2 ** 26,
+        parse=None,
+        delimiter="\n",
+        encoding="utf-8",
+        **kwargs
+    ):
+        self.chunk_size = chunk_size
+        self.parse = parse
+        self.delimiter = delimiter
+        self.encoding = encoding
+        ParallelStream.__init__(self, upstream, **kwargs)
+
+    def update(self, x, who=None):
+        client = self._client()
+        futures = [
+            client.submit(
+                _read_line_chunk,
+                x,
+                start,
+                stop,
+                self.parse,
+                self.delimiter,
+                self.encoding,
+            )
+            for start, stop in _line_chunks(
+                x, self.chunk_size, self.delimiter.encode(self.encoding)
+            )
+        ]
+        L = []
+        for future in futures:
+            y = self._emit(future)
+            if type(y) is list:
+                L.extend(y)
+            else:
+                L.append(y)
+        return L
+
+
 @args_kwargs
 @ParallelStream.register_api()
 class gather(core.Stream):
@@ -180,44 +495,280 @@ class gather(core.Stream):
 @args_kwargs
 @ParallelStream.register_api()
 class map(ParallelStream):
-    def __init__(self, upstream, func, *args, **kwargs):
+    """ Apply a function to every element on the backend
+
+    Parameters
+    ----------
+    func : callable
+    *args :
+        The arguments to pass to the function.
+    speculative : float, optional
+        If given, the quantile of the task durations (between 0 and 1)
+        which marks a task as a straggler. Once enough durations are known,
+        a task still running after ``straggler_factor`` times that duration
+        is submitted again. Whichever attempt finishes first is emitted and
+        the other one is cancelled if it did not start yet. Only supported
+        for executor backends (eg "thread").
+    straggler_factor : float, optional
+        Defaults to 2
+    **kwargs:
+        Keyword arguments to pass to func
+    """
+
+    # the number of durations needed before speculating
+    min_durations = 10
+    _swap_wrappers = {"func": filter_null_wrapper}
+
+    def __init__(
+        self,
+        upstream,
+        func,
+        *args,
+        speculative=None,
+        straggler_factor=2.0,
+        **kwargs
+    ):
         self.func = filter_null_wrapper(func)
         stream_name = kwargs.pop("stream_name", None)
+        priority = kwargs.pop("priority", None)
         self.kwargs = kwargs
         self.args = args
-
-        ParallelStream.__init__(self, upstream, stream_name=stream_name)
+        self.speculative = speculative
+        self.straggler_factor = straggler_factor
+        self.durations = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+        ParallelStream.__init__(
+            self,
+            upstream,
+            stream_name=stream_name,
+            priority=priority,
+            ensure_io_loop=speculative is not None,
+        )
+        if speculative is not None and not isinstance(
+            self.default_client(), Executor
+        ):
+            raise ValueError(
+                "Speculative execution needs an executor backend"
+            )
 
     def update(self, x, who=None):
-        client = self.default_client()
+        client = self._client()
         result = client.submit(self.func, x, *self.args, **self.kwargs)
+        if self.speculative is not None:
+            result = self._speculate(client, result, x)
         return self._emit(result)
 
+    def _threshold(self):
+        if len(self.durations) < self.min_durations:
+            return None
+        durations = sorted(self.durations)
+        i = int(self.speculative * (len(durations) - 1))
+        return durations[i] * self.straggler_factor
+
+    def _speculate(self, client, primary, x):
+        """Proxy a task which is resubmitted if it straggles"""
+        out = Future()
+        attempts = [primary]
+
+        def done(start):
+            def inner(f):
+                if f.cancelled():
+                    return
+                with self._lock:
+                    if out.done():
+                        return
+                    self.durations.append(time() - start)
+                    if f.exception() is not None:
+                        out.set_exception(f.exception())
+                    else:
+                        out.set_result(f.result())
+                for other in attempts:
+                    if other is not f:
+                        other.cancel()
+
+            return inner
+
+        def check():
+            if out.done():
+                return
+            duplicate = client.submit(
+                self.func, x, *self.args, **self.kwargs
+            )
+            attempts.append(duplicate)
+            duplicate.add_done_callback(done(time()))
+
+        primary.add_done_callback(done(time()))
+        threshold = self._threshold()
+        if threshold is not None:
+            # ``update`` may run outside of the event loop thread
+            self.loop.add_callback(self.loop.call_later, threshold, check)
+        return out
+
+
+@args_kwargs
+@ParallelStream.register_api()
+class map_batched(ParallelStream, core.map_batched):
+    """ Apply a vectorized function to batches of futures
+
+    The batch is computed in a single task on the backend. By default one
+    future is emitted per element, each of which is a ``getitem`` task on
+    the batch result, so there is still one (cheap) task per element. With
+    ``split=False`` the future of the whole list of results is emitted
+    instead, which saves those tasks, and the results can be split after
+    gathering (eg with ``flatten``).
+
+    Parameters
+    ----------
+    split : bool, optional
+        If True (default) emit one future per element, otherwise one future
+        per batch holding the list of results, without filtered elements
+
+    See Also
+    --------
+    streamz_ext.core.map_batched
+
+    Examples
+    --------
+    >>> (source.scatter().map_batched(np.sqrt, n=100, split=False)
+    ...  .gather().flatten().sink(print))
+    """
+
+    def __init__(
+        self,
+        upstream,
+        func,
+        *args,
+        n=1000,
+        interval=None,
+        stack=True,
+        split=True,
+        **kwargs
+    ):
+        self.split = split
+        super().__init__(
+            upstream,
+            func,
+            *args,
+            n=n,
+            interval=interval,
+            stack=stack,
+            **kwargs
+        )
+
+    def _compute(self, batch):
+        client = self._client()
+        result = client.submit(
+            _apply_batched,
+            self.func,
+            batch,
+            self.stack,
+            self.args,
+            self.kwargs,
+            not self.split,
+        )
+        if not self.split:
+            return [result]
+        return [client.submit(getitem, result, i) for i in range(len(batch))]
+
+
+@args_kwargs
+@ParallelStream.register_api()
+class tree_reduce(ParallelStream):
+    """ Reduce windows of futures on the backend
+
+    Every element is a sequence of futures, as emitted by ``partition``,
+    ``sliding_window`` or ``timed_window``. They are combined pairwise as a
+    balanced tree of tasks, so the reduction takes a logarithmic number of
+    steps and only the final future is emitted, the data stays on the
+    workers.
+
+    Parameters
+    ----------
+    func : callable
+        An associative binary function
+    **kwargs:
+        Keyword arguments to pass to func
+
+    Examples
+    --------
+    >>> (source.scatter().map(load_frame).partition(16)
+    ...  .tree_reduce(operator.add).gather().sink(print))
+    """
+
+    def __init__(self, upstream, func, **kwargs):
+        self.func = func
+        stream_name = kwargs.pop("stream_name", None)
+        priority = kwargs.pop("priority", None)
+        self.kwargs = kwargs
+        ParallelStream.__init__(
+            self, upstream, stream_name=stream_name, priority=priority
+        )
+
+    def update(self, x, who=None):
+        if not len(x):
+            return []
+        client = self._client()
+        return self._emit(_tree_reduce(client, self.func, x, self.kwargs))
+
 
 @args_kwargs
 @ParallelStream.register_api()
 class accumulate(ParallelStream):
+    """ Accumulate results with previous state on the backend
+
+    Parameters
+    ----------
+    func : callable
+        The accumulating function
+    start : object, optional
+        The initial state
+    returns_state : bool, optional
+        If True ``func`` returns a ``(state, result)`` tuple
+    associative : bool, optional
+        If True ``func`` is taken to be associative. Partial aggregates of
+        power of two sized blocks of elements are kept (like the digits of a
+        binary counter) and every running total is a tree reduction of the
+        O(log n) blocks, so the tasks do not wait on the previous total and
+        run in parallel. Can not be used with ``returns_state``.
+    **kwargs:
+        Keyword arguments to pass to func
+    """
+
+    _swap_wrappers = {"func": filter_null_wrapper}
+
     def __init__(
         self,
         upstream,
         func,
         start=core.no_default,
         returns_state=False,
+        associative=False,
         **kwargs
     ):
+        if associative and returns_state:
+            raise ValueError("associative accumulation can not return state")
         self.func = filter_null_wrapper(func)
         self.state = start
         self.returns_state = returns_state
+        self.associative = associative
+        # the (size, partial aggregate) of the blocks, oldest first
+        self.blocks = []
         stream_name = kwargs.pop("stream_name", None)
+        priority = kwargs.pop("priority", None)
         self.kwargs = kwargs
-        ParallelStream.__init__(self, upstream, stream_name=stream_name)
+        ParallelStream.__init__(
+            self, upstream, stream_name=stream_name, priority=priority
+        )
 
     def update(self, x, who=None):
+        if self.associative:
+            return self._update_associative(x)
         if self.state is core.no_default:
             self.state = x
             return self._emit(self.state)
         else:
-            client = self.default_client()
+            client = self._client()
             result = client.submit(self.func, self.state, x, **self.kwargs)
             if self.returns_state:
                 state = client.submit(getitem, result, 0)
@@ -227,6 +778,24 @@ class accumulate(ParallelStream):
             self.state = state
             return self._emit(result)
 
+    def _update_associative(self, x):
+        client = self._client()
+        self.blocks.append((1, x))
+        while (
+            len(self.blocks) > 1
+            and self.blocks[-1][0] == self.blocks[-2][0]
+        ):
+            (n, a), (_, b) = self.blocks[-2:]
+            self.blocks[-2:] = [
+                (2 * n, client.submit(_combine, self.func, a, b, self.kwargs))
+            ]
+        parts = [block for _, block in self.blocks]
+        if self.state is not core.no_default:
+            parts.insert(0, self.state)
+        total = _tree_reduce(client, self.func, parts, self.kwargs)
+        # filtered elements do not produce a total
+        return self._emit(client.submit(_unless_null, x, total))
+
 
 @args_kwargs
 @ParallelStream.register_api()
@@ -234,13 +803,16 @@ class starmap(ParallelStream):
     def __init__(self, upstream, func, *args, **kwargs):
         self.func = func
         stream_name = kwargs.pop("stream_name", None)
+        priority = kwargs.pop("priority", None)
         self.kwargs = kwargs
         self.args = args
 
-        ParallelStream.__init__(self, upstream, stream_name=stream_name)
+        ParallelStream.__init__(
+            self, upstream, stream_name=stream_name, priority=priority
+        )
 
     def update(self, x: Future, who=None):
-        client = self.default_client()
+        client = self._client()
         result = client.submit(
             filter_null_wrapper(apply),
             filter_null_wrapper(self.func),
@@ -254,18 +826,21 @@ class starmap(ParallelStream):
 @args_kwargs
 @ParallelStream.register_api()
 class filter(ParallelStream):
+    _swap_wrappers = {"predicate": _null_predicate}
+
     def __init__(self, upstream, predicate, *args, **kwargs):
-        if predicate is None:
-            predicate = _truthy
-        self.predicate = return_null(predicate)
+        self.predicate = _null_predicate(predicate)
         stream_name = kwargs.pop("stream_name", None)
+        priority = kwargs.pop("priority", None)
         self.kwargs = kwargs
         self.args = args
 
-        ParallelStream.__init__(self, upstream, stream_name=stream_name)
+        ParallelStream.__init__(
+            self, upstream, stream_name=stream_name, priority=priority
+        )
 
     def update(self, x, who=None):
-        client = self.default_client()
+        client = self._client()
         result = client.submit(self.predicate, x, *self.args, **self.kwargs)
         return self._emit(result)
 
@@ -278,7 +853,7 @@ class pluck(ParallelStream):
         super().__init__(upstream, **kwargs)
 
     def update(self, x, who=None):
-        client = self.default_client()
+        client = self._client()
         if isinstance(self.pick, Sequence):
             return self._emit(
                 client.submit(filter_null_wrapper(_pluck), self.pick, x)
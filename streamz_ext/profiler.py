@@ -0,0 +1,222 @@
+"""Per node profiling of pipelines"""
+from collections import defaultdict
+from functools import wraps
+import json
+import threading
+import time
+
+import networkx as nx
+
+from .graph import (
+    _method_node,
+    create_graph_nodes,
+    decorate_nodes,
+    readable_graph,
+    undecorate_nodes,
+)
+
+
+# per thread CPU time needs Python 3.7, before that the CPU time of the
+# whole process is the best estimate
+_thread_time = getattr(time, "thread_time", time.process_time)
+
+
+def _is_future(x):
+    return hasattr(x, "add_done_callback") and hasattr(x, "done")
+
+
+class Profiler(object):
+    """Attribute wall and CPU time to every node in a pipeline
+
+    Every node's ``update`` is wrapped (via ``decorate_nodes``) so that the
+    time spent in it is recorded both inclusive and exclusive of the
+    downstream nodes it emits to. For futures (emitted by ``ParallelStream``
+    nodes or returned by asynchronous updates) the time until the future
+    resolves is recorded as the node's wait time.
+
+    Examples
+    --------
+    >>> source = Stream()
+    >>> source.map(func).sink(print)
+    >>> with Profiler(source) as prof:
+    ...     for i in range(100):
+    ...         source.emit(i)
+    >>> prof.to_speedscope('pipeline.speedscope.json')
+    """
+
+    def __init__(self, node):
+        """
+
+        Parameters
+        ----------
+        node : Stream instance
+            A node in the pipeline to be profiled
+        """
+        g, names = readable_graph(node)
+        # ``;`` separates frames in collapsed stacks
+        self.names = {
+            k: v.strip().replace(";", ":") for k, v in names.items()
+        }
+        self.graph = nx.DiGraph()
+        create_graph_nodes(node, self.graph)
+        self.stats = {
+            name: {
+                "calls": 0,
+                "wall": 0.0,
+                "cpu": 0.0,
+                "wall_exclusive": 0.0,
+                "cpu_exclusive": 0.0,
+                "wait": 0.0,
+            }
+            for name in self.names.values()
+        }
+        self.stacks = defaultdict(float)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._decorated = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """Start profiling the pipeline"""
+        self._decorated = decorate_nodes(
+            self.graph,
+            update_decorator=self._update_decorator,
+            emit_decorator=self._emit_decorator,
+        )
+
+    def stop(self):
+        """Stop profiling, restoring the original node methods"""
+        undecorate_nodes(self._decorated)
+        self._decorated = {}
+
+    def _record_wait(self, name, path, future, start):
+        def done(_):
+            wait = time.perf_counter() - start
+            with self._lock:
+                self.stats[name]["wait"] += wait
+                self.stacks[path + ";[wait]"] += wait
+
+        future.add_done_callback(done)
+
+    def _update_decorator(self, func):
+        name = self.names[hash(_method_node(func))]
+        stats = self.stats[name]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = getattr(self._local, "stack", None)
+            if stack is None:
+                stack = self._local.stack = []
+            # name, downstream wall time and downstream cpu time
+            frame = [name, 0.0, 0.0]
+            stack.append(frame)
+            wall = time.perf_counter()
+            cpu = _thread_time()
+            try:
+                ret = func(*args, **kwargs)
+            finally:
+                wall = time.perf_counter() - wall
+                cpu = _thread_time() - cpu
+                path = ";".join(f[0] for f in stack)
+                stack.pop()
+                if stack:
+                    stack[-1][1] += wall
+                    stack[-1][2] += cpu
+                with self._lock:
+                    stats["calls"] += 1
+                    stats["wall"] += wall
+                    stats["cpu"] += cpu
+                    stats["wall_exclusive"] += wall - frame[1]
+                    stats["cpu_exclusive"] += cpu - frame[2]
+                    self.stacks[path] += wall - frame[1]
+            if _is_future(ret) and not ret.done():
+                self._record_wait(name, path, ret, time.perf_counter())
+            return ret
+
+        return wrapper
+
+    def _emit_decorator(self, func):
+        name = self.names[hash(_method_node(func))]
+
+        @wraps(func)
+        def wrapper(x, *args, **kwargs):
+            if _is_future(x) and not x.done():
+                stack = getattr(self._local, "stack", None) or [[name]]
+                self._record_wait(
+                    name,
+                    ";".join(f[0] for f in stack),
+                    x,
+                    time.perf_counter(),
+                )
+            return func(x, *args, **kwargs)
+
+        return wrapper
+
+    def to_collapsed(self, filename):
+        """Write the profile in the collapsed stack format
+
+        The file can be rendered with ``flamegraph.pl`` or loaded into
+        speedscope, the weights are exclusive wall times in microseconds.
+
+        Parameters
+        ----------
+        filename : str
+            The file to write to
+        """
+        with self._lock:
+            stacks = dict(self.stacks)
+        with open(filename, "w") as f:
+            for path, wall in sorted(stacks.items()):
+                f.write("{} {}\n".format(path, int(wall * 1e6)))
+
+    def to_speedscope(self, filename, name="streamz_ext pipeline"):
+        """Write the profile as a speedscope file
+
+        Parameters
+        ----------
+        filename : str
+            The file to write to
+        name : str, optional
+            The name of the profile
+        """
+        with self._lock:
+            stacks = dict(self.stacks)
+        frames = []
+        frame_idx = {}
+        samples = []
+        weights = []
+        for path, wall in sorted(stacks.items()):
+            sample = []
+            for frame in path.split(";"):
+                if frame not in frame_idx:
+                    frame_idx[frame] = len(frames)
+                    frames.append({"name": frame})
+                sample.append(frame_idx[frame])
+            samples.append(sample)
+            weights.append(wall * 1e6)
+        profile = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "streamz_ext",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "microseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+        with open(filename, "w") as f:
+            json.dump(profile, f)
@@ -0,0 +1,272 @@
+"""Record elements of pipelines and replay them at controlled rates"""
+from functools import wraps
+import mmap
+import pickle
+import struct
+import time
+
+from tornado import gen
+from zstreamz.sources import Source
+
+from ._compat import ContextVar
+from .core import Stream
+
+# when the element being processed was emitted by ``replay``
+_emitted_at = ContextVar("streamz_ext_emitted_at", default=None)
+
+# timestamp, pickle size and number of out of band buffers of an element
+_header = struct.Struct("<dQQ")
+_size = struct.Struct("<Q")
+# buffers start on cache line boundaries so arrays are well aligned
+_alignment = 64
+
+
+def _padding(offset):
+    return -offset % _alignment
+
+
+@Stream.register_api()
+class record(Stream):
+    """ Record elements with their arrival times to a file
+
+    Elements are pickled with protocol 5, the buffers of numpy arrays (and
+    anything else supporting out of band pickling) are written raw so that
+    they can be memory mapped when the recording is read. Before Python 3.8
+    elements are pickled in band with the highest protocol available.
+    Elements are passed on unchanged.
+
+    Parameters
+    ----------
+    filename : str
+        The file to write to, it is overwritten
+
+    Examples
+    --------
+    >>> source.record('run.rec')
+    >>> # later
+    >>> replay = Stream.replay('run.rec', rate=10)
+
+    See Also
+    --------
+    read_recording
+    replay
+    """
+
+    def __init__(self, upstream, filename, **kwargs):
+        self.filename = filename
+        self.file = open(filename, "wb")
+        self._offset = 0
+        Stream.__init__(self, upstream, **kwargs)
+
+    def _write(self, data):
+        self.file.write(data)
+        self._offset += len(data)
+
+    def update(self, x, who=None):
+        buffers = []
+        if pickle.HIGHEST_PROTOCOL >= 5:
+            data = pickle.dumps(x, protocol=5, buffer_callback=buffers.append)
+        else:
+            data = pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+        raws = [b.raw() for b in buffers]
+        self._write(_header.pack(time.time(), len(data), len(raws)))
+        for raw in raws:
+            self._write(_size.pack(raw.nbytes))
+        self._write(data)
+        for raw in raws:
+            self._write(b"\0" * _padding(self._offset))
+            self._write(raw)
+        self.file.flush()
+        return self._emit(x)
+
+    def close(self):
+        """Close the file"""
+        self.file.close()
+
+
+def read_recording(filename):
+    """Read the elements of a recording
+
+    Arrays are backed by a read only memory map of the file, so they are not
+    copied into memory.
+
+    Parameters
+    ----------
+    filename : str
+        The file written by ``record``
+
+    Yields
+    ------
+    t : float
+        The time the element was recorded
+    x : object
+        The element
+    """
+    with open(filename, "rb") as f:
+        if not f.seek(0, 2):
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    offset = 0
+    while offset < len(mm):
+        t, n, n_buffers = _header.unpack_from(mm, offset)
+        offset += _header.size
+        sizes = [
+            _size.unpack_from(mm, offset + i * _size.size)[0]
+            for i in range(n_buffers)
+        ]
+        offset += n_buffers * _size.size
+        data = view[offset : offset + n]
+        offset += n
+        buffers = []
+        for size in sizes:
+            offset += _padding(offset)
+            buffers.append(view[offset : offset + size])
+            offset += size
+        if buffers:
+            yield t, pickle.loads(data, buffers=buffers)
+        else:
+            yield t, pickle.loads(data)
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+@Stream.register_api(staticmethod)
+class replay(Source):
+    """ Replay a recording at a controlled rate
+
+    The end to end latency, from emission to the end of the ``update`` of
+    every sink (or the future it returned), is measured for every element.
+
+    Parameters
+    ----------
+    filename : str
+        The file written by ``record``
+    rate : float or None, optional
+        The speed up relative to the recorded rate, 1 (default) replays at
+        the original rate. If None the elements are emitted as fast as the
+        pipeline takes them.
+    start : bool, optional
+        Whether to start running immediately; otherwise call
+        ``stream.start()`` explicitly.
+
+    Examples
+    --------
+    >>> source = Stream.replay('run.rec', rate=4)
+    >>> source.map(process).sink(display)
+    >>> source.start()
+    >>> # once ``source.stopped``
+    >>> source.report()['latency']['p99']
+    """
+
+    def __init__(self, filename, rate=1.0, start=False, **kwargs):
+        self.filename = filename
+        self.rate = rate
+        self.latencies = []
+        self.emitted = 0
+        self._started_at = None
+        self._last = None
+        self._measured = set()
+        super().__init__(ensure_io_loop=True, **kwargs)
+        self.stopped = True
+        if start:
+            self.start()
+
+    def start(self):
+        self._measure_sinks()
+        self.stopped = False
+        self.loop.add_callback(self.do_replay)
+
+    def stop(self):
+        self.stopped = True
+
+    def _measure_sinks(self):
+        stack = [self]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(node.downstreams)
+            if not node.downstreams and node not in self._measured:
+                self._measured.add(node)
+                node.update = self._measured_update(node.update)
+
+    def _record_latency(self, emitted):
+        self._last = time.perf_counter()
+        self.latencies.append(self._last - emitted)
+
+    def _measured_update(self, func):
+        @wraps(func)
+        def wrapper(x, *args, **kwargs):
+            emitted = _emitted_at.get()
+            result = func(x, *args, **kwargs)
+            if emitted is not None:
+                if gen.is_future(result):
+                    result.add_done_callback(
+                        lambda _: self._record_latency(emitted)
+                    )
+                else:
+                    self._record_latency(emitted)
+            return result
+
+        return wrapper
+
+    @gen.coroutine
+    def do_replay(self):
+        self._started_at = time.perf_counter()
+        first = None
+        for t, x in read_recording(self.filename):
+            if self.stopped:
+                break
+            if first is None:
+                first = t
+            if self.rate is not None:
+                delay = (
+                    self._started_at
+                    + (t - first) / self.rate
+                    - time.perf_counter()
+                )
+                if delay > 0:
+                    yield gen.sleep(delay)
+            token = _emitted_at.set(time.perf_counter())
+            try:
+                future = self._emit(x)
+            finally:
+                _emitted_at.reset(token)
+            self.emitted += 1
+            yield future
+        self.stopped = True
+
+    def report(self):
+        """Summarize the replay
+
+        Returns
+        -------
+        dict
+            The number of ``elements`` emitted, the ``duration`` in seconds
+            until the last sink finished, the ``throughput`` in elements per
+            second and the ``latency`` percentiles (``p50``, ``p90``,
+            ``p99`` and ``max``) in seconds
+        """
+        latencies = sorted(self.latencies)
+        duration = 0.0
+        if self._started_at is not None:
+            end = self._last if self.stopped else time.perf_counter()
+            duration = (end or self._started_at) - self._started_at
+        return {
+            "elements": self.emitted,
+            "duration": duration,
+            "throughput": self.emitted / duration if duration else None,
+            "latency": {
+                "p50": _percentile(latencies, 0.5),
+                "p90": _percentile(latencies, 0.9),
+                "p99": _percentile(latencies, 0.99),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
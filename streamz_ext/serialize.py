@@ -0,0 +1,271 @@
+"""Save pipelines to disk and load them without rebuilding them"""
+import inspect
+import pickle
+
+import networkx as nx
+
+from .core import Stream, no_default
+from .graph import create_graph_nodes
+
+
+class _Ref(object):
+    """Placeholder for a node in a serialized pipeline"""
+
+    def __init__(self, idx):
+        self.idx = idx
+
+
+def _unwrap(func):
+    # parallel nodes wrap their functions to handle filtered elements
+    return inspect.unwrap(func) if callable(func) else func
+
+
+def _history(node):
+    history = getattr(node, "non_hash_seen", None)
+    return history.maxlen if history is not None else None
+
+
+def _start(node):
+    # ``start`` is the initial state for accumulators but a flag for sources
+    # ``no_default`` is compared by identity so it can not be round tripped
+    if "state" in vars(node) and node.state is not no_default:
+        return node.state
+    return inspect.Parameter.empty
+
+
+def _f(node):
+    return node.file.name
+
+
+def _n(node):
+    if "n" in vars(node):
+        return node.n
+    return node.queue.maxsize
+
+
+def _emit_on(node):
+    if tuple(node.emit_on) == tuple(node.upstreams):
+        return inspect.Parameter.empty
+    return tuple(node.emit_on)
+
+
+# constructor arguments which are not stored under the same attribute name
+_getters = {
+    "func": lambda node: _unwrap(node.func),
+    "predicate": lambda node: _unwrap(node.predicate),
+    "start": _start,
+    "n": _n,
+    "history": _history,
+    "f": _f,
+    "backend": lambda node: node.default_client,
+    "stream_name": lambda node: node.name
+    if node.name is not None
+    else inspect.Parameter.empty,
+}
+
+# keyword arguments consumed by ``**kwargs`` of some nodes
+_extra_kwargs = {"emit_on": _emit_on, "maxsize": lambda node: node.maxsize}
+
+
+def _init(node):
+    """The ``__init__`` which defines the arguments of a node
+
+    ``ParallelStream`` is mixed into the core nodes, so its generic
+    ``__init__`` is skipped in favor of the core node's one.
+    """
+    from .parallel import ParallelStream
+
+    for cls in type(node).__mro__:
+        if "__init__" in vars(cls) and cls is not ParallelStream:
+            return vars(cls)["__init__"]
+
+
+def _node_arguments(node):
+    """Recover the arguments a node was created with
+
+    Parameters
+    ----------
+    node : Stream instance
+
+    Returns
+    -------
+    args : list
+    kwargs : dict
+    """
+    from .parallel import ParallelStream
+
+    args = []
+    kwargs = {}
+    # arguments after a skipped default have to be passed by keyword
+    positional = True
+    upstreams = [u for u in node.upstreams if u is not None]
+    params = list(inspect.signature(_init(node)).parameters.items())[1:]
+    for name, p in params:
+        if p.kind == p.VAR_POSITIONAL:
+            if isinstance(getattr(node, name, None), tuple):
+                args.extend(getattr(node, name))
+            else:
+                args.extend(upstreams[len(args) :])
+        elif p.kind == p.VAR_KEYWORD:
+            if isinstance(getattr(node, name, None), dict):
+                kwargs.update(getattr(node, name))
+            for k, getter in _extra_kwargs.items():
+                if k in vars(node):
+                    value = getter(node)
+                    if value is not inspect.Parameter.empty:
+                        kwargs[k] = value
+            if node.name is not None:
+                kwargs["stream_name"] = node.name
+        elif name in ["upstream", "lossless"]:
+            args.append(upstreams[0] if upstreams else None)
+        elif name == "upstreams" and upstreams and not args:
+            kwargs[name] = upstreams
+            positional = False
+        else:
+            value = inspect.Parameter.empty
+            if name in _getters:
+                try:
+                    value = _getters[name](node)
+                except AttributeError:
+                    pass
+            elif name not in [
+                "loop",
+                "asynchronous",
+                "ensure_io_loop",
+                "upstreams",
+            ]:
+                value = vars(node).get(name, value)
+            if value is inspect.Parameter.empty:
+                if p.default is p.empty:
+                    raise ValueError(
+                        "Can not recover argument {} of {}".format(name, node)
+                    )
+                positional = False
+            elif positional and p.kind == p.POSITIONAL_OR_KEYWORD:
+                args.append(value)
+            else:
+                kwargs[name] = value
+    # the first parallel node sets the backend for the ones downstream
+    if isinstance(node, ParallelStream) and not any(
+        hasattr(u, "default_client") for u in upstreams
+    ):
+        kwargs["backend"] = node.default_client
+    if getattr(node, "priority", None) is not None:
+        kwargs["priority"] = node.priority
+    return args, kwargs
+
+
+def _to_refs(value, index):
+    if isinstance(value, Stream):
+        return _Ref(index[value])
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_refs(v, index) for v in value)
+    return value
+
+
+def _from_refs(value, nodes):
+    if isinstance(value, _Ref):
+        return nodes[value.idx]
+    if isinstance(value, (list, tuple)):
+        return type(value)(_from_refs(v, nodes) for v in value)
+    return value
+
+
+def dumps(namespace):
+    """Serialize the pipelines in a namespace
+
+    Functions are stored by reference, so they need to be importable where
+    the pipeline is loaded. Nodes are recreated from their current
+    attributes, so pipelines should be serialized before any data is
+    emitted into them.
+
+    Parameters
+    ----------
+    namespace : dict
+        The namespace (as returned by ``link``, or eg ``globals()``)
+        holding nodes of the pipelines. Only the nodes are kept, the other
+        entries are not serialized and missing from the loaded namespace.
+
+    Returns
+    -------
+    bytes
+    """
+    graph = nx.DiGraph()
+    for v in namespace.values():
+        if isinstance(v, Stream) and hash(v) not in graph:
+            create_graph_nodes(v, graph)
+    nodes = [graph.nodes[n]["node"]() for n in nx.topological_sort(graph)]
+    index = {node: i for i, node in enumerate(nodes)}
+    records = []
+    for node in nodes:
+        args, kwargs = _node_arguments(node)
+        if not node.upstreams or node.upstreams == [None]:
+            kwargs.setdefault("asynchronous", node.asynchronous)
+        records.append(
+            {
+                "type": type(node),
+                "args": _to_refs(args, index),
+                "kwargs": {k: _to_refs(v, index) for k, v in kwargs.items()},
+                # keep the execution order (as set with ``first``)
+                "downstreams": [index[d] for d in node.downstreams],
+            }
+        )
+    names = {
+        k: index[v]
+        for k, v in namespace.items()
+        if isinstance(v, Stream) and v in index
+    }
+    return pickle.dumps(
+        {"nodes": records, "names": names}, pickle.HIGHEST_PROTOCOL
+    )
+
+
+def loads(data):
+    """Load pipelines serialized with ``dumps``
+
+    Parameters
+    ----------
+    data : bytes
+
+    Returns
+    -------
+    dict
+        The namespace of the serialized nodes, without the entries which
+        were not nodes
+    """
+    state = pickle.loads(data)
+    nodes = []
+    for record in state["nodes"]:
+        args = _from_refs(record["args"], nodes)
+        kwargs = {
+            k: _from_refs(v, nodes) for k, v in record["kwargs"].items()
+        }
+        nodes.append(record["type"](*args, **kwargs))
+    for node, record in zip(nodes, state["nodes"]):
+        od = node.downstreams.data._od
+        refs = {r(): r for r in od}
+        for i in record["downstreams"]:
+            od.move_to_end(refs[nodes[i]])
+    return {k: nodes[i] for k, i in state["names"].items()}
+
+
+def dump(namespace, filename):
+    """Serialize the pipelines in a namespace to a file
+
+    See Also
+    --------
+    dumps
+    """
+    with open(filename, "wb") as f:
+        f.write(dumps(namespace))
+
+
+def load(filename):
+    """Load pipelines from a file written by ``dump``
+
+    See Also
+    --------
+    loads
+    """
+    with open(filename, "rb") as f:
+        return loads(f.read())
@@ -1 +1,179 @@
+import ctypes
+import ctypes.util
+from fnmatch import fnmatch
+from glob import glob, has_magic
+import os
+import struct
+import sys
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.queues import Queue
 from zstreamz.sources import *
+from zstreamz.sources import filenames as _filenames
+
+from .core import Stream
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+
+_inotify_event = struct.Struct("iIII")
+
+
+def _inotify_watch(directory, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+    """Create a non-blocking inotify file descriptor watching a directory
+
+    Parameters
+    ----------
+    directory : str
+        The directory to watch
+    mask : int, optional
+        The inotify event mask, defaults to files closed after writing and
+        files moved into the directory
+
+    Returns
+    -------
+    int or None
+        The file descriptor, None if inotify is not available
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        init = libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _inotify_names(data):
+    """Parse raw inotify events into file names
+
+    Returns
+    -------
+    names : list of str
+        The names of the files in the events
+    overflow : bool
+        Whether the kernel event queue overflowed, dropping events
+    """
+    names = []
+    overflow = False
+    i = 0
+    while i + _inotify_event.size <= len(data):
+        wd, mask, cookie, length = _inotify_event.unpack_from(data, i)
+        i += _inotify_event.size
+        name = data[i : i + length].rstrip(b"\0")
+        i += length
+        if mask & IN_Q_OVERFLOW:
+            overflow = True
+        elif name and not mask & IN_ISDIR:
+            names.append(os.fsdecode(name))
+    return names, overflow
+
+
+@Stream.register_api(staticmethod)
+class filenames(_filenames):
+    """ Stream over filenames in a directory
+
+    On Linux new files are picked up through inotify as soon as they are
+    closed after writing (or moved into the directory), otherwise the
+    directory is polled.
+
+    Parameters
+    ----------
+    path: string
+        Directory path or globstring over which to search for files
+    poll_interval: Number
+        Seconds between checking path when polling
+    start: bool (False)
+        Whether to start running immediately; otherwise call stream.start()
+        explicitly.
+    watch: bool or None
+        If True use inotify to watch the directory, raising if it is not
+        available. If False always poll. If None (default) use inotify when
+        it is available and poll otherwise.
+
+    Examples
+    --------
+    >>> source = Stream.filenames('path/to/dir')  # doctest: +SKIP
+    >>> source = Stream.filenames('path/to/*.csv', poll_interval=0.500)  # doctest: +SKIP
+    """
+
+    def __init__(
+        self, path, poll_interval=0.100, start=False, watch=None, **kwargs
+    ):
+        self.watch = watch
+        self.fd = None
+        super().__init__(
+            path, poll_interval=poll_interval, start=start, **kwargs
+        )
+
+    def start(self):
+        directory, pattern = os.path.split(self.path)
+        if self.watch is not False and not has_magic(directory):
+            self.fd = _inotify_watch(directory or ".")
+        if self.fd is None:
+            if self.watch:
+                raise OSError(
+                    "Can not watch {} with inotify".format(self.path)
+                )
+            return super().start()
+        self.stopped = False
+        self.queue = Queue()
+        self.loop.add_callback(self.do_watch)
+
+    def stop(self):
+        """Stop watching the directory"""
+        self.stopped = True
+        if self.fd is not None:
+            self.loop.add_callback(self._close_watch)
+
+    def _close_watch(self):
+        if self.fd is not None:
+            self.loop.remove_handler(self.fd)
+            os.close(self.fd)
+            self.fd = None
+            # wake up ``do_watch`` so that it can exit
+            self.queue.put_nowait(None)
+
+    def _enqueue(self, fns):
+        for fn in sorted(fns):
+            if fn not in self.seen:
+                self.seen.add(fn)
+                self.queue.put_nowait(fn)
+
+    def _handle_events(self, fd, events):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        names, overflow = _inotify_names(data)
+        if overflow:
+            self._enqueue(glob(self.path))
+        directory, pattern = os.path.split(self.path)
+        self._enqueue(
+            os.path.join(directory, name)
+            for name in names
+            if fnmatch(name, pattern)
+        )
+
+    @gen.coroutine
+    def do_watch(self):
+        # the watch is already active so files created while globbing are
+        # also reported, ``seen`` removes the duplicates
+        self.loop.add_handler(self.fd, self._handle_events, IOLoop.READ)
+        self._enqueue(glob(self.path))
+        while not self.stopped:
+            fn = yield self.queue.get()
+            if fn is not None:
+                yield self._emit(fn)
@@ -0,0 +1,233 @@
+"""Serve the status of running pipelines over HTTP"""
+from collections import deque
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+from socketserver import ThreadingMixIn
+import threading
+import time
+
+import networkx as nx
+
+from .graph import (
+    _method_node,
+    create_graph_nodes,
+    decorate_nodes,
+    readable_graph,
+    undecorate_nodes,
+)
+
+_page = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>streamz_ext pipeline</title>
+<style>
+body { font-family: sans-serif; }
+td, th { padding: 2px 10px; text-align: right; }
+td:first-child { text-align: left; }
+.running { background: #ffeb99; }
+.error { background: #ff9999; }
+</style>
+</head>
+<body>
+<table>
+<thead><tr>
+<th>node</th><th>status</th><th>count</th><th>errors</th>
+<th>mean (ms)</th><th>p99 (ms)</th><th>backlog</th>
+</tr></thead>
+<tbody id="nodes"></tbody>
+</table>
+<script>
+function ms(x) { return x === null ? "" : (1000 * x).toFixed(3); }
+async function poll() {
+  const status = await (await fetch("status.json")).json();
+  const rows = Object.entries(status.nodes).map(([name, n]) =>
+    `<tr class="${n.status}"><td>${name}</td><td>${n.status}</td>` +
+    `<td>${n.count}</td><td>${n.errors}</td>` +
+    `<td>${ms(n.latency.mean)}</td><td>${ms(n.latency.p99)}</td>` +
+    `<td>${n.backlog === undefined ? "" : n.backlog.backlog}</td></tr>`);
+  document.getElementById("nodes").innerHTML = rows.join("");
+}
+poll();
+setInterval(poll, 1000);
+</script>
+</body>
+</html>
+"""
+
+
+def _latency_stats(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return dict.fromkeys(["mean", "p50", "p99", "max"])
+    n = len(latencies)
+    return {
+        "mean": sum(latencies) / n,
+        "p50": latencies[n // 2],
+        "p99": latencies[int(0.99 * (n - 1))],
+        "max": latencies[-1],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send(self, body, content_type):
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/", "/index.html"):
+            self._send(_page, "text/html; charset=utf-8")
+        elif self.path == "/status.json":
+            status = self.server.status.snapshot()
+            self._send(json.dumps(status, default=str), "application/json")
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # ``http.server.ThreadingHTTPServer`` needs Python 3.7
+    daemon_threads = True
+
+
+class StatusServer(object):
+    """Serve the status of a pipeline as JSON over HTTP
+
+    The ``update`` of every node only counts its calls and errors and
+    records its latency, the JSON snapshots are built when requested on the
+    server's own thread, so monitoring needs no display and puts almost no
+    load on the pipeline. ``/status.json`` serves the snapshot, ``/`` a
+    minimal page polling it.
+
+    Examples
+    --------
+    >>> server = StatusServer(source, port=8787)
+    >>> server.start()
+    >>> # curl http://127.0.0.1:8787/status.json
+    """
+
+    def __init__(self, node, host="127.0.0.1", port=0, latencies=1000):
+        """
+
+        Parameters
+        ----------
+        node : Stream instance
+            A node in the pipeline
+        host : str, optional
+            The address to listen on, defaults to localhost only
+        port : int, optional
+            The port to listen on, defaults to any free port
+        latencies : int, optional
+            The number of recent latencies kept per node, defaults to 1000
+        """
+        g, names = readable_graph(node)
+        self.graph = nx.DiGraph()
+        create_graph_nodes(node, self.graph)
+        self.names = {k: v.strip() for k, v in names.items()}
+        self.edges = [
+            (self.names[u], self.names[v]) for u, v in self.graph.edges
+        ]
+        self.status = {
+            self.names[n]: {
+                "status": "waiting",
+                "count": 0,
+                "errors": 0,
+                "last_error": None,
+                "latencies": deque(maxlen=latencies),
+            }
+            for n in nx.topological_sort(self.graph)
+        }
+        self.server = _ThreadingHTTPServer((host, port), _Handler)
+        self.server.status = self
+        self._thread = None
+        self._decorated = {}
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """Start recording the status and serving it"""
+        self._decorated = decorate_nodes(
+            self.graph, update_decorator=self._update_decorator
+        )
+        self._thread = threading.Thread(
+            target=self.server.serve_forever,
+            name="streamz_ext-status",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving, restoring the original node methods"""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread = None
+        self.server.server_close()
+        undecorate_nodes(self._decorated)
+        self._decorated = {}
+
+    def _update_decorator(self, func):
+        status = self.status[self.names[hash(_method_node(func))]]
+        latencies = status["latencies"]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            status["status"] = "running"
+            start = time.perf_counter()
+            try:
+                ret = func(*args, **kwargs)
+            except Exception as e:
+                status["status"] = "error"
+                status["errors"] += 1
+                status["last_error"] = repr(e)
+                raise
+            latencies.append(time.perf_counter() - start)
+            status["count"] += 1
+            status["status"] = "waiting"
+            return ret
+
+        return wrapper
+
+    def snapshot(self):
+        """The current status of every node
+
+        Returns
+        -------
+        dict
+            The ``time``, the ``edges`` between the node names and the
+            ``nodes`` by name, upstream nodes first, with their ``status``
+            ("running", "waiting" or "error"), update ``count``, ``errors``,
+            ``last_error``, ``latency`` stats in seconds and for nodes
+            holding elements their ``backlog`` stats
+        """
+        nodes = {}
+        for n, attrs in self.graph.nodes.items():
+            name = self.names[n]
+            status = self.status[name]
+            entry = {k: v for k, v in status.items() if k != "latencies"}
+            entry["latency"] = _latency_stats(tuple(status["latencies"]))
+            node = attrs["node"]()
+            if hasattr(node, "backlog_stats"):
+                entry["backlog"] = node.backlog_stats()
+            nodes[name] = entry
+        return {
+            "time": time.time(),
+            "edges": self.edges,
+            "nodes": {k: nodes[k] for k in self.status},
+        }
@@ -0,0 +1,182 @@
+"""Element level tracing of pipelines to Chrome trace event files"""
+from functools import wraps
+import itertools
+import json
+import os
+import threading
+import time
+
+import networkx as nx
+
+from ._compat import ContextVar
+from .graph import (
+    _method_node,
+    create_graph_nodes,
+    decorate_nodes,
+    readable_graph,
+    undecorate_nodes,
+)
+from .profiler import _is_future
+
+# the id of the element being processed
+_element_id = ContextVar("streamz_ext_element_id", default=None)
+
+
+class Tracer(object):
+    """Follow elements through a pipeline
+
+    Every element entering the pipeline gets an id which is carried along
+    (in a context variable) while it flows through the nodes. The ``update``
+    of every node is recorded as a complete event on the thread it ran on,
+    futures emitted by ``ParallelStream`` nodes are recorded as async events
+    from submission to resolution. The trace can be written in the Chrome
+    trace event format and viewed with ``chrome://tracing`` or Perfetto.
+
+    Elements created inside the pipeline, eg by windows emitting on a timer,
+    get new ids.
+
+    Examples
+    --------
+    >>> with Tracer(source) as tracer:
+    ...     for x in data:
+    ...         source.emit(x)
+    >>> tracer.to_chrome('pipeline.trace.json')
+    """
+
+    def __init__(self, node):
+        """
+
+        Parameters
+        ----------
+        node : Stream instance
+            A node in the pipeline to be traced
+        """
+        g, names = readable_graph(node)
+        self.names = {k: v.strip() for k, v in names.items()}
+        self.graph = nx.DiGraph()
+        create_graph_nodes(node, self.graph)
+        self.events = []
+        self.pid = os.getpid()
+        self._ids = itertools.count()
+        self._future_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._decorated = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _now(self):
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def _record(self, event):
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", threading.get_ident())
+        with self._lock:
+            self.events.append(event)
+
+    def start(self):
+        """Start tracing the pipeline"""
+        self._decorated = decorate_nodes(
+            self.graph,
+            update_decorator=self._update_decorator,
+            emit_decorator=self._emit_decorator,
+        )
+
+    def stop(self):
+        """Stop tracing, restoring the original node methods"""
+        undecorate_nodes(self._decorated)
+        self._decorated = {}
+
+    def _tagged(self, func, *args, **kwargs):
+        """Call ``func`` with an element id set"""
+        token = None
+        if _element_id.get() is None:
+            token = _element_id.set(next(self._ids))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if token is not None:
+                _element_id.reset(token)
+
+    def _update_decorator(self, func):
+        name = self.names[hash(_method_node(func))]
+
+        def traced(x, *args, **kwargs):
+            start = self._now()
+            try:
+                return func(x, *args, **kwargs)
+            finally:
+                self._record(
+                    {
+                        "name": name,
+                        "cat": "update",
+                        "ph": "X",
+                        "ts": start,
+                        "dur": self._now() - start,
+                        "args": {"element": _element_id.get()},
+                    }
+                )
+
+        @wraps(func)
+        def wrapper(x, *args, **kwargs):
+            return self._tagged(traced, x, *args, **kwargs)
+
+        return wrapper
+
+    def _trace_future(self, name, future):
+        event = {
+            "name": name,
+            "cat": "future",
+            "id": next(self._future_ids),
+            "args": {"element": _element_id.get()},
+        }
+        self._record(dict(event, ph="b", ts=self._now()))
+
+        def done(_):
+            self._record(dict(event, ph="e", ts=self._now()))
+
+        future.add_done_callback(done)
+
+    def _emit_decorator(self, func):
+        name = self.names[hash(_method_node(func))]
+
+        def traced(x, *args, **kwargs):
+            if _is_future(x) and not x.done():
+                self._trace_future(name, x)
+            return func(x, *args, **kwargs)
+
+        @wraps(func)
+        def wrapper(x, *args, **kwargs):
+            return self._tagged(traced, x, *args, **kwargs)
+
+        return wrapper
+
+    def to_chrome(self, filename):
+        """Write the trace as a Chrome trace event file
+
+        Parameters
+        ----------
+        filename : str
+            The file to write to
+        """
+        with self._lock:
+            events = list(self.events)
+        threads = {e["tid"] for e in events}
+        names = {t.ident: t.name for t in threading.enumerate()}
+        events.extend(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"name": names.get(tid, str(tid))},
+            }
+            for tid in sorted(threads)
+        )
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from streamz_ext import Stream
+from streamz_ext.autoparallel import (
+    _best_segments,
+    _rewire,
+    autoparallelize,
+    plan_parallel,
+)
+from streamz_ext.parallel import gather, scatter
+
+gen_test = pytest.mark.gen_test
+
+
+def slow_inc(x):
+    time.sleep(0.01)
+    return x + 1
+
+
+def double(x):
+    return 2 * x
+
+
+def test_best_segments():
+    import networkx as nx
+
+    chain = ["a", "b", "c", "d"]
+    graph = nx.DiGraph([("a", "b"), ("b", "c"), ("c", "d"), ("d", "e")])
+    # seconds spent in 10 calls, the cheap nodes only carry noise
+    wall = {"a": 1e-4, "b": 0.1, "c": 1e-4, "d": 0.1}
+    stats = {
+        n: {"calls": 10, "wall_exclusive": w} for n, w in wall.items()
+    }
+    nbytes = dict.fromkeys("abcde", 100)
+    costs = {"task_overhead": 1e-3, "bandwidth": None}
+    segments = _best_segments(chain, graph, stats, nbytes, 4, costs)
+    # the cheap node between two expensive ones saves a gather and scatter
+    assert [s for s, est in segments] == [["b", "c", "d"]]
+
+    stats["a"]["wall_exclusive"] = 0.1
+    segments = _best_segments(chain, graph, stats, nbytes, 4, costs)
+    assert [s for s, est in segments] == [chain]
+
+    stats["d"]["wall_exclusive"] = 1e-4
+    segments = _best_segments(chain, graph, stats, nbytes, 4, costs)
+    assert [s for s, est in segments] == [["a", "b"]]
+
+
+def test_plan_parallel():
+    source = Stream()
+    source.map(double).map(double).sink_to_list()
+    assert (
+        plan_parallel(source, range(5), workers=4, task_overhead=1e-3) == []
+    )
+
+    source = Stream()
+    a = source.map(double)
+    b = a.map(slow_inc)
+    b.sink_to_list()
+    plans = plan_parallel(source, range(5), workers=4, task_overhead=1e-3)
+    assert len(plans) == 1
+    assert plans[0]["nodes"] == [b]
+    assert plans[0]["speedup"] > 1.5
+    # shipping the data outweighs the compute
+    assert not plan_parallel(source, range(5), workers=4, bandwidth=1)
+
+
+def test_rewire():
+    source = Stream()
+    other = Stream()
+    a = source.map(double)
+    z = a.zip(other)
+    c = a.combine_latest(other, emit_on=a)
+    held = a.map(double)
+    held.keep = [a]
+    new = source.map(slow_inc)
+    for d in [z, c, held]:
+        _rewire(d, a, new)
+    assert z.upstreams == [new, other]
+    assert list(z.buffers) == [new, other]
+    assert c.missing == {new, other} and tuple(c.emit_on) == (new,)
+    # unknown attributes are left alone
+    assert held.upstreams == [new] and held.keep == [a]
+    assert not a.downstreams
+
+
+@gen_test()
+def test_autoparallelize():
+    source = Stream(asynchronous=True)
+    a = source.map(double)
+    b = a.map(slow_inc)
+    L = b.sink_to_list()
+    L2 = source.sink_to_list()
+
+    plans = autoparallelize(source, range(5), workers=4, task_overhead=1e-3)
+    assert [p["nodes"] for p in plans] == [[b]]
+    # the execution order is kept
+    assert list(source.downstreams)[0] is a
+    (s,) = a.downstreams
+    (m,) = s.downstreams
+    (g,) = m.downstreams
+    assert type(s) is scatter and type(g) is gather
+    assert len(g.downstreams) == 1 and not b.downstreams
+    del L[:]
+    del L2[:]
+
+    for i in range(5):
+        yield source.emit(i)
+
+    assert L == [2 * i + 1 for i in range(5)]
+    assert L2 == list(range(5))
@@ -1,6 +1,39 @@
+import pytest
+
+from streamz_ext import Stream
 from streamz_ext.batch import *
 
 try:
     from zstreamz.tests.test_batch import *
 except ImportError:
     pass
+
+
+def test_column_batch():
+    np = pytest.importorskip("numpy")
+    records = [{"x": i, "y": 2 * i} for i in range(5)]
+    b = ColumnBatch.from_records(records)
+    assert len(b) == 5
+    assert b.to_records() == records
+    # slices are views
+    assert np.shares_memory(b[1:3]["x"], b["x"])
+    assert b.filter(lambda b: b["x"] > 2).to_records() == records[3:]
+    np.testing.assert_array_equal(
+        b.map(lambda b: {"z": b["x"] + b["y"]}).pluck("z"),
+        [0, 3, 6, 9, 12],
+    )
+    assert ColumnBatch.from_records([(1, "a")]).to_records() == [(1, "a")]
+    with pytest.raises(ValueError):
+        ColumnBatch({"x": [1], "y": [1, 2]})
+
+
+def test_columnar():
+    pytest.importorskip("numpy")
+    source = Stream()
+    records = Batch(stream=source, example=[{"x": 1, "y": 2}])
+    cols = to_columnar(records)
+    assert isinstance(cols, Columnar)
+    L = cols.filter(lambda b: b["x"] > 1).to_stream().sink_to_list()
+    source.emit([{"x": 1, "y": 2}, {"x": 3, "y": 4}])
+    source.emit([{"x": 5, "y": 6}])
+    assert L == [{"x": 3, "y": 4}, {"x": 5, "y": 6}]
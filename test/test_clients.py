@@ -0,0 +1,36 @@
+import threading
+
+from streamz_ext.clients import PriorityThreadPoolExecutor, executor_to_client
+from streamz_ext.core import identity
+
+
+def test_priority_thread_pool_executor():
+    ex = PriorityThreadPoolExecutor(max_workers=1)
+    event = threading.Event()
+    L = []
+    ex.submit(event.wait)
+    futures = [
+        ex.submit(L.append, "low"),
+        ex.submit(L.append, "high", priority=10),
+        ex.submit(L.append, "low2"),
+    ]
+    event.set()
+    for f in futures:
+        f.result()
+    assert L == ["high", "low", "low2"]
+    ex.shutdown()
+
+
+def test_priority_dependencies():
+    ex = executor_to_client(PriorityThreadPoolExecutor(max_workers=2))
+    event = threading.Event()
+    blockers = [ex.submit(event.wait) for _ in range(2)]
+    inputs = [ex.submit(identity, i) for i in range(4)]
+    # these wait on their inputs in the worker threads, they must not run
+    # before them
+    outputs = [ex.submit(lambda x: x + 1, f, priority=10) for f in inputs]
+    assert all(f.priority == 0 for f in outputs)
+    event.set()
+    assert [f.result(timeout=5) for f in outputs] == [1, 2, 3, 4]
+    assert all(f.result() for f in blockers)
+    ex.shutdown()
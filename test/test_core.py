@@ -1,4 +1,10 @@
+import json
 import operator as op
+import subprocess
+import sys
+import time
+
+import pytest
 
 try:
     from zstreamz.tests.test_core import *
@@ -139,3 +145,259 @@ def test_destroy_pipeline():
     pipeline = source.map(op.add).zip(source).sink(print)
     destroy_pipeline(source)
     assert pipeline.upstreams == []
+
+
+def test_zip_backlog_stats():
+    a = Stream()
+    b = Stream()
+    z = a.zip(b)
+    for i in range(3):
+        a.emit(i)
+    stats = z.backlog_stats()
+    assert stats["backlog"] == 3
+    assert stats["high_water"] == 3
+    assert stats["oldest_age"] > 0
+
+    b.emit(0)
+    stats = z.backlog_stats()
+    assert stats["backlog"] == 2
+    assert stats["high_water"] == 3
+
+
+def test_map_batched():
+    np = pytest.importorskip("numpy")
+    calls = []
+
+    def f(x):
+        calls.append(len(x))
+        return np.sqrt(x)
+
+    source = Stream()
+    L = source.map_batched(f, n=3).sink_to_list()
+    for i in range(7):
+        source.emit(i * i)
+    assert L == list(range(6))
+    assert calls == [3, 3]
+
+
+def test_map_batched_interval():
+    pytest.importorskip("numpy")
+    source = Stream()
+    L = source.map_batched(lambda x: x + 1, n=10, interval=0.05).sink_to_list()
+    source.emit(1)
+    source.emit(2)
+    assert L == []
+    deadline = time.time() + 2
+    while not L and time.time() < deadline:
+        time.sleep(0.01)
+    assert L == [2, 3]
+
+
+def test_map_batched_interval_threads():
+    pytest.importorskip("numpy")
+    source = Stream()
+    # timeouts flush on the loop thread while elements keep arriving
+    L = source.map_batched(
+        lambda x: x, n=7, interval=0.0005, stack=False
+    ).sink_to_list()
+    for i in range(2000):
+        source.emit(i)
+        if i % 50 == 0:
+            time.sleep(0.001)
+    deadline = time.time() + 2
+    while len(L) < 2000 and time.time() < deadline:
+        time.sleep(0.01)
+    assert L == list(range(2000))
+
+
+def test_partition_by():
+    source = Stream()
+    merged = source.partition_by(
+        op.itemgetter(0),
+        2,
+        lambda s: s.pluck(1).accumulate(op.add, start=0),
+    )
+    L = merged.sink_to_list()
+    for k, v in [(0, 1), (1, 10), (0, 2), (1, 20), (0, 3)]:
+        source.emit((k, v))
+    # every key keeps its own running total
+    assert L == [1, 10, 3, 30, 6]
+
+
+def test_isolate_failures():
+    def inc(x):
+        if x == 2:
+            raise ValueError(x)
+        return x + 1
+
+    source = Stream()
+    b = source.map(inc)
+    L = b.sink_to_list()
+    L2 = source.sink_to_list()
+    dead = b.isolate_failures().sink_to_list()
+    for i in range(4):
+        source.emit(i)
+    # the failure does not reach emit or the sibling branch
+    assert L == [1, 2, 4]
+    assert L2 == [0, 1, 2, 3]
+    (failure,) = dead
+    assert failure["node"] is b
+    assert failure["element"] == 2
+    assert isinstance(failure["exception"], ValueError)
+    assert "ValueError" in failure["traceback"]
+
+
+def test_isolate_failures_pipeline():
+    source = Stream()
+    c = source.map(op.add, 1).map(lambda x: 1 / x)
+    L = c.map(op.neg).sink_to_list()
+    dead_letter = Stream()
+    dead = dead_letter.sink_to_list()
+    assert source.isolate_failures(dead_letter, pipeline=True) is dead_letter
+    for i in [0, -1, 1]:
+        source.emit(i)
+    assert L == [-1, -0.5]
+    assert [d["node"] for d in dead] == [c]
+    assert isinstance(dead[0]["exception"], ZeroDivisionError)
+
+
+def test_shed():
+    a = Stream()
+    b = Stream()
+    s = a.shed(2, latest=4)
+    passed = s.sink_to_list()
+    z = s.zip(b)
+    L = z.sink_to_list()
+    for i in range(9):
+        a.emit(i)
+    # pass, then every second element, then only the latest is held
+    assert passed == [0, 1, 2, 4, 6]
+    assert s.mode == "latest"
+    assert s.held == 8
+    assert s.dropped == 3
+
+    for i in range(5):
+        b.emit(i)
+    deadline = time.time() + 2
+    while len(passed) < 6 and time.time() < deadline:
+        time.sleep(0.01)
+    # the held element is emitted once the backlog is down
+    assert passed[-1] == 8
+    assert s.mode == "pass"
+    assert L[-1] == (6, 4)
+    assert z.backlog_stats()["backlog"] == 1
+
+
+def test_shed_emits_on_loop():
+    import threading
+
+    source = Stream()
+    s = source.shed(2)
+    threads = s.map(lambda x: threading.get_ident()).sink_to_list()
+    # elements passed from another thread are emitted on the loop
+    for i in range(3):
+        s.update(i)
+    assert len(threads) == 3
+    assert len(set(threads)) == 1
+    assert threading.get_ident() not in threads
+
+
+def _import(module):
+    """The heavy modules imported along with the module and the time the
+    import took in seconds"""
+    heavy = ["distributed", "matplotlib", "grave", "networkx"]
+    code = (
+        "import json, sys, time; "
+        "t = time.perf_counter(); "
+        "import {}; "
+        "t = time.perf_counter() - t; "
+        "print(json.dumps([[m for m in {} if m in sys.modules], t]))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code.format(module, heavy)],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    imported, seconds = json.loads(out.stdout)
+    return set(imported), seconds
+
+
+def test_import_is_lazy():
+    baseline, baseline_time = _import("zstreamz")
+    imported, _ = _import(
+        "streamz_ext, streamz_ext.parallel, streamz_ext.graph"
+    )
+    # nothing heavy is imported beyond what zstreamz itself pulls in
+    assert imported <= baseline
+    # the best of a few runs, the bound is loose to allow for noisy runners
+    import_time = min(_import("streamz_ext")[1] for _ in range(3))
+    assert import_time < 3 * baseline_time + 0.5
+
+
+def test_swap():
+    source = Stream()
+    m = source.map(lambda x: x + 1)
+    total = m.accumulate(op.add)
+    L = total.sink_to_list()
+    f = source.filter(lambda x, n: x > n, 1)
+    F = f.sink_to_list()
+    S = []
+    s = source.map(lambda x: (x, x)).starsink(lambda x, y: S.append(x + y))
+
+    source.emit(1)
+    source.emit(2)
+    m.swap(func=lambda x: 10 * x)
+    f.swap(args=(2,))
+    s.swap(func=lambda x, y: S.append(x * y))
+    source.emit(3)
+    # the accumulated state is kept
+    assert L == [2, 5, 35]
+    assert F == [2, 3]
+    assert S == [2, 4, 9]
+
+    f.swap(predicate=None, args=())
+    source.emit(0)
+    assert F == [2, 3]
+    with pytest.raises(ValueError):
+        m.swap(predicate=bool)
+    with pytest.raises(ValueError):
+        source.pluck(0).swap(func=len)
+
+
+def test_swap_between_elements():
+    import threading
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def wait(x):
+        started.set()
+        release.wait(5)
+        return x
+
+    source = Stream(ensure_io_loop=True)
+    m = source.map(wait)
+    L = m.sink_to_list()
+    emitter = threading.Thread(target=source.emit, args=(1,))
+    emitter.start()
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+    # swapping from the main thread waits for the element in flight
+    m.swap(func=lambda x: -x)
+    assert L == [1]
+    emitter.join(5)
+    source.emit(2)
+    assert L == [1, -2]
+
+
+def test_swap_loop_not_running():
+    from tornado.ioloop import IOLoop
+
+    loop = IOLoop()
+    source = Stream(loop=loop)
+    m = source.map(lambda x: x + 1)
+    # nothing runs the loop, the change is made right away
+    m.swap(func=lambda x: x - 1)
+    assert m.func(1) == 0
+    loop.close()
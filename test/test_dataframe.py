@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from streamz_ext.dataframe import (
+    DataFrame,
+    GroupbyAgg,
+    _GroupState,
+    groupby_agg,
+)
+
+
+def test_groupby_agg():
+    df = pd.DataFrame(
+        {
+            "k": np.arange(100) % 7,
+            "x": np.random.normal(size=100),
+            "y": np.random.random(100),
+        }
+    )
+    sdf = DataFrame(example=df.iloc[:0])
+    aggs = ["count", "sum", "mean", "var", "min", "max", "quantile"]
+    out = groupby_agg(sdf.groupby("k"), aggs, q=[0.5])
+    L = out.stream.sink_to_list()
+    for i in range(0, 100, 30):
+        sdf.emit(df.iloc[i : i + 30])
+    result = L[-1].sort_index()
+    expected = df.groupby("k").agg(
+        ["count", "sum", "mean", "var", "min", "max", "median"]
+    )
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+
+    mean = groupby_agg(sdf.groupby("k").x, ["mean"]).stream.sink_to_list()
+    sdf.emit(df)
+    assert list(mean[-1].columns) == ["mean"]
+
+
+def test_group_state_reservoir():
+    state = _GroupState(["x"], q=[0.5], reservoir=100)
+    keys = pd.Index(np.arange(30) % 3)
+    state.update(keys, np.arange(30.0)[:, None])
+    # the samples only grow as far as needed
+    assert state.samples.shape[2] < 100
+    state.update(keys.repeat(20), np.random.random((600, 1)))
+    assert state.samples.shape[2] == 100
+    assert not np.isnan(state.samples[:3]).any()
+
+    state = _GroupState(["x"], q=[0.5], reservoir=100)
+    state.update(keys, np.arange(30.0)[:, None])
+    np.testing.assert_allclose(
+        state.result(["quantile"]).to_numpy().ravel(), [13.5, 14.5, 15.5]
+    )
+
+
+def test_groupby_agg_unknown():
+    with pytest.raises(ValueError):
+        GroupbyAgg("x", grouper="k", aggs=["mode"])
+
+
+def test_groupby_agg_windowed():
+    sdf = DataFrame(example=pd.DataFrame({"k": [], "x": []}))
+    with pytest.raises(ValueError):
+        groupby_agg(sdf.window(n=10).groupby("k"), ["mean"])
@@ -42,3 +42,49 @@ def test_run_vis_smoke():
             pass
     plt.pause(.1)
     plt.close("all")
+
+
+def test_cached_layout():
+    import networkx as nx
+
+    g = nx.path_graph(5, create_using=nx.DiGraph)
+    layout = CachedLayout("spring", seed=0)
+    pos = layout(g)
+    g.add_edge(4, 5)
+    pos2 = layout(g)
+    assert all((pos[n] == pos2[n]).all() for n in pos)
+    assert 5 in pos2
+
+    big = nx.path_graph(1000, create_using=nx.DiGraph)
+    pos = CachedLayout(max_nodes=500)(big)
+    # the layered layout puts every node of a path in its own layer
+    assert len({p[1] for p in pos.values()}) == 1000
+
+
+def test_layered_layout():
+    import networkx as nx
+
+    g = nx.DiGraph([("a", "b"), ("b", "c"), ("a", "c"), ("a", "d")])
+    pos = layered_layout(g)
+    # nodes are as deep as their longest path from a source
+    assert pos["a"][1] > pos["b"][1] == pos["d"][1] > pos["c"][1]
+
+
+def test_collapse_chains():
+    source = Stream()
+    a = source.map(lambda x: x + 1).map(lambda x: x * 2)
+    b1 = a.sink(print)
+    b2 = a.filter(bool).map(str).sink(print)
+    g, names = readable_graph(source)
+    collapsed, owner = collapse_chains(g)
+    # source -> map -> map collapse, as does filter -> map -> sink
+    assert len(collapsed) == 3
+    assert set(owner.values()) <= set(collapsed)
+    assert owner[names[hash(a)]] == names[hash(source)]
+    assert len(collapsed.nodes[owner[names[hash(b2)]]]["members"]) == 3
+
+    grouped, owner = collapse_chains(
+        g, {"sinks": [names[hash(b1)], names[hash(b2)]]}, chains=False
+    )
+    assert len(grouped) == len(g) - 1
+    assert "sinks" in grouped
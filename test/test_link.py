@@ -46,3 +46,23 @@ def test_double_link():
         ab["in_a"].emit(i)
     assert L == [(i + 1) * 2 for i in range(10)]
     assert L2 == [((i + 1) * 2) + i + 1 for i in range(10)]
+
+
+def test_template():
+    def make_a():
+        source = Stream()
+        out_a = source.accumulate(lambda acc, x: acc + x, start=0)
+        return locals()
+
+    def make_b(source, out_a, **kwargs):
+        out_b = source.unique(history=2).zip(out_a)
+        return locals()
+
+    template = Template(make_a, make_b)
+    for _ in range(2):
+        ns = template.reset()
+        L = ns["out_b"].sink_to_list()
+        for i in [1, 1, 2]:
+            ns["source"].emit(i)
+        assert L == [(1, 1), (2, 2)]
+        ns["out_b"].downstreams.clear()
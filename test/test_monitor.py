@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from streamz_ext import Stream
+from streamz_ext.monitor import (
+    BacklogMonitor,
+    LoopLagMonitor,
+    backlog_report,
+    memory_report,
+)
+
+
+def test_backlog_report():
+    a = Stream()
+    b = Stream()
+    a.zip(b, stream_name="z").sink(print)
+    for i in range(3):
+        a.emit(i)
+    report = backlog_report(a)
+    assert list(report) == ["z zip"]
+    assert report["z zip"]["backlog"] == 3
+
+
+def test_bottleneck():
+    a = Stream()
+    b = Stream()
+    c = Stream()
+    z1 = a.zip(b, stream_name="z1")
+    z1.zip(c, stream_name="z2").sink(print)
+    monitor = BacklogMonitor(a)
+    assert monitor.bottleneck() is None
+
+    a.emit(1)
+    b.emit(1)
+    assert monitor.bottleneck() == "z2 zip"
+
+    a.emit(2)
+    assert monitor.bottleneck() == "z1 zip"
+    assert monitor.bottleneck() is None
+
+
+def test_memory_report():
+    np = pytest.importorskip("numpy")
+    source = Stream()
+    source.sliding_window(3, stream_name="w").sink(print)
+    source.accumulate(lambda acc, x: acc + x, stream_name="a").sink(print)
+    before = {k.split()[0]: v for k, v in memory_report(source).items()}
+    for i in range(5):
+        source.emit(np.full(1000, i, dtype="f8"))
+    report = {k.split()[0]: v for k, v in memory_report(source).items()}
+    # the window holds three arrays
+    grown = report["w"]["nbytes"] - before["w"]["nbytes"]
+    assert 3 * 8000 <= grown < 4 * 8000
+    assert report["a"]["nbytes"] >= 8000
+    assert report["a"]["remote_nbytes"] == 0
+
+    z = source.zip(source.map(len), stream_name="z")
+    monitor = BacklogMonitor(z)
+    source.emit([1])
+    assert "nbytes" in monitor.poll(memory=True)["z zip"]
+
+
+def test_loop_lag_monitor():
+    def blocking_inc(x):
+        time.sleep(0.5)
+        return x + 1
+
+    source = Stream(ensure_io_loop=True)
+    m = source.map(blocking_inc)
+    L = m.sink_to_list()
+    with LoopLagMonitor(source, threshold=0.1) as monitor:
+        time.sleep(0.1)
+        source.emit(1)
+        time.sleep(0.1)
+    assert L == [2]
+    (event,) = monitor.events
+    assert event["node"] is m
+    assert "blocking_inc" in event["stack"]
+    assert monitor.max_lag >= 0.3
+
+
+def test_remote_nbytes_asynchronous_client():
+    from streamz_ext.monitor import _remote_nbytes
+
+    class Client(object):
+        asynchronous = True
+
+        def nbytes(self, keys=None, summary=True):
+            raise AssertionError("an asynchronous client can not be asked")
+
+    class RemoteFuture(object):
+        key = "x"
+        client = Client()
+
+    assert _remote_nbytes([RemoteFuture()]) == 0
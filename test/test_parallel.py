@@ -45,6 +45,102 @@ def test_map(backend):
     assert all(isinstance(f, Future) for f in futures_L)
 
 
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_map_batched(backend):
+    source = Stream(asynchronous=True)
+    futures = (
+        scatter(source, backend=backend)
+        .filter(lambda x: x % 2 == 0)
+        .map_batched(lambda x: [i + 1 for i in x], n=3, stack=False)
+    )
+    futures_L = futures.sink_to_list()
+    L = futures.gather().sink_to_list()
+
+    for i in range(6):
+        yield source.emit(i)
+
+    assert L == [1, 3, 5]
+    assert len(futures_L) == 6
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_partition_by(backend):
+    source = Stream(asynchronous=True)
+    L = source.partition_by(
+        lambda x: x % 2, 2, lambda s: s.scan(add), backend=backend
+    ).sink_to_list()
+
+    for i in range(6):
+        yield source.emit(i)
+
+    assert L == [0, 1, 2, 4, 6, 9]
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_tree_reduce(backend):
+    source = Stream(asynchronous=True)
+    futures = (
+        scatter(source, backend=backend)
+        .filter(lambda x: x != 3)
+        .partition(5)
+        .tree_reduce(add)
+    )
+    futures_L = futures.sink_to_list()
+    L = futures.gather().sink_to_list()
+
+    for i in range(10):
+        yield source.emit(i)
+
+    assert L == [0 + 1 + 2 + 4, 5 + 6 + 7 + 8 + 9]
+    assert all(isinstance(f, Future) for f in futures_L)
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_map_speculative(backend):
+    attempts = []
+
+    def straggling_inc(x):
+        attempts.append(x)
+        if x == 15 and attempts.count(x) == 1:
+            time.sleep(2)
+        else:
+            time.sleep(0.001)
+        return x + 1
+
+    source = Stream(asynchronous=True)
+    futures = scatter(source, backend=backend).map(
+        straggling_inc, speculative=0.9
+    )
+    L = futures.gather().sink_to_list()
+
+    t0 = time.time()
+    for i in range(20):
+        yield source.emit(i)
+
+    assert L == [i + 1 for i in range(20)]
+    assert attempts.count(15) == 2
+    assert time.time() - t0 < 1.5
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_priority(backend):
+    source = Stream(asynchronous=True)
+    futures = scatter(source, backend=backend, priority=5).map(inc)
+    L = futures.gather().sink_to_list()
+    assert futures.priority == 5
+    assert futures.map(inc, priority=1).priority == 1
+
+    for i in range(5):
+        yield source.emit(i)
+
+    assert L == [1, 2, 3, 4, 5]
+
+
 @pytest.mark.parametrize("backend", test_params)
 @gen_test()
 def test_scan(backend):
@@ -81,6 +177,28 @@ def test_scan_state(backend):
     assert L == [0, 1, 3]
 
 
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_scan_associative(backend):
+    source = Stream(asynchronous=True)
+    futures = (
+        scatter(source, backend=backend)
+        .filter(lambda x: x != 3)
+        .scan(add, start=10, associative=True)
+    )
+    L = futures.gather().sink_to_list()
+
+    for i in range(7):
+        yield source.emit(i)
+
+    assert L == [10, 11, 13, 17, 22, 28]
+    assert [n for n, _ in futures.blocks] == [4, 2, 1]
+    with pytest.raises(ValueError):
+        scatter(source, backend=backend).scan(
+            add, returns_state=True, associative=True
+        )
+
+
 @pytest.mark.parametrize("backend", test_params)
 @gen_test()
 def test_zip(backend):
@@ -343,3 +461,143 @@ def test_combined_latest(backend):
     while len(L) < len(futures_L):
         yield gen.sleep(.01)
     assert L == [(i, i) for i in range(5)]
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_read_chunks(backend, tmpdir):
+    fn = str(tmpdir.join("data.txt"))
+    with open(fn, "w") as f:
+        for i in range(100):
+            f.write("{}\n".format(i))
+
+    source = Stream(asynchronous=True)
+    futures = source.read_chunks(chunk_size=32, parse=int, backend=backend)
+    futures_L = futures.sink_to_list()
+    L = futures.gather().sink_to_list()
+
+    yield source.emit(fn)
+
+    while len(L) < len(futures_L):
+        yield gen.sleep(.01)
+
+    assert len(futures_L) > 1
+    assert all(isinstance(f, Future) for f in futures_L)
+    assert [i for f in futures_L for i in f.result()] == list(range(100))
+    assert sorted(i for chunk in L for i in chunk) == list(range(100))
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_backlog_stats(backend):
+    source = Stream(asynchronous=True)
+    futures = scatter(source, backend=backend).map(slowinc, delay=0.2)
+    L = futures.buffer(10).gather().sink_to_list()
+
+    for i in range(3):
+        yield source.emit(i)
+    stats = futures.backlog_stats()
+    assert stats["backlog"] == 3
+    assert stats["oldest_age"] > 0
+
+    while len(L) < 3:
+        yield gen.sleep(.01)
+    stats = futures.backlog_stats()
+    assert stats["backlog"] == 0
+    assert stats["high_water"] == 3
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_swap(backend):
+    source = Stream(asynchronous=True)
+    s = scatter(source, backend=backend)
+    m = s.map(inc)
+    f = m.filter(lambda x: x % 2 == 0)
+    L = f.gather().sink_to_list()
+
+    for i in range(4):
+        yield source.emit(i)
+    m.swap(func=lambda x: 10 * x)
+    f.swap(predicate=lambda x: x > 10)
+    for i in range(4):
+        yield source.emit(i)
+
+    assert L == [2, 4, 20, 30]
+
+
+@pytest.mark.parametrize("backend", test_params)
+@gen_test()
+def test_map_batched_unsplit(backend):
+    source = Stream(asynchronous=True)
+    futures = (
+        scatter(source, backend=backend)
+        .filter(lambda x: x % 2 == 0)
+        .map_batched(
+            lambda x: [i + 1 for i in x], n=3, stack=False, split=False
+        )
+    )
+    futures_L = futures.sink_to_list()
+    L = futures.gather().flatten().sink_to_list()
+
+    for i in range(6):
+        yield source.emit(i)
+
+    assert L == [1, 3, 5]
+    assert len(futures_L) == 2
+
+
+_two_workers = []
+
+
+def two_workers_client():
+    from streamz_ext.clients import (
+        PriorityThreadPoolExecutor,
+        executor_to_client,
+    )
+
+    if not _two_workers:
+        _two_workers.append(
+            executor_to_client(PriorityThreadPoolExecutor(max_workers=2))
+        )
+    return _two_workers[0]
+
+
+@gen_test(timeout=10)
+def test_priority_more_elements_than_workers():
+    source = Stream(asynchronous=True)
+    low = scatter(source, backend=two_workers_client)
+    high = scatter(source, backend=two_workers_client, priority=5)
+    L = high.map(slowinc, delay=0.01).gather().sink_to_list()
+    # a high priority branch fed by a low priority one
+    M = low.map(slowinc, delay=0.01).map(inc, priority=10).gather()
+    M = M.sink_to_list()
+
+    for i in range(8):
+        source.emit(i)
+    while len(L) < 8 or len(M) < 8:
+        yield gen.sleep(0.01)
+    assert sorted(L) == list(range(1, 9))
+    assert sorted(M) == list(range(2, 10))
+
+
+_plain_threads = []
+
+
+def plain_threads_client():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from streamz_ext.clients import executor_to_client
+
+    if not _plain_threads:
+        _plain_threads.append(executor_to_client(ThreadPoolExecutor(2)))
+    return _plain_threads[0]
+
+
+def test_priority_not_supported():
+    source = Stream()
+    with pytest.raises(ValueError):
+        scatter(source, backend=plain_threads_client, priority=1)
+    s = scatter(source, backend=plain_threads_client)
+    with pytest.raises(ValueError):
+        s.map(inc, priority=1)
@@ -0,0 +1,65 @@
+import json
+import time
+
+from streamz_ext import Stream
+from streamz_ext.profiler import Profiler
+from streamz_ext.status import StatusServer
+
+
+def test_profiler(tmpdir):
+    def slow_inc(x):
+        time.sleep(0.01)
+        return x + 1
+
+    source = Stream()
+    a = source.map(slow_inc, stream_name="a")
+    L = a.map(slow_inc, stream_name="b").sink_to_list()
+
+    with Profiler(source) as prof:
+        for i in range(5):
+            source.emit(i)
+
+    assert L == [i + 2 for i in range(5)]
+    stats = {k.split()[0]: v for k, v in prof.stats.items()}
+    assert stats["a"]["calls"] == 5
+    # a includes the time spent in b but not exclusively
+    assert stats["a"]["wall"] > stats["b"]["wall"] >= 0.05
+    assert stats["a"]["wall_exclusive"] < stats["a"]["wall"]
+    assert "update" not in a.__dict__
+
+    fn = str(tmpdir.join("out.collapsed"))
+    prof.to_collapsed(fn)
+    with open(fn) as f:
+        lines = f.read().splitlines()
+    assert any(line.count(";") == 2 for line in lines)
+
+    fn = str(tmpdir.join("out.json"))
+    prof.to_speedscope(fn)
+    with open(fn) as f:
+        profile = json.load(f)
+    assert len(profile["shared"]["frames"]) == 3
+
+
+def test_profiler_keeps_later_wrappers():
+    source = Stream()
+    a = source.map(lambda x: 1 / x, stream_name="a")
+    L = a.sink_to_list()
+    server = StatusServer(source)
+    server.start()
+    prof = Profiler(source)
+    prof.start()
+    dead = a.isolate_failures().sink_to_list()
+    source.emit(2)
+    # stopped out of order, only their own wrappers may be removed
+    server.stop()
+    prof.stop()
+
+    source.emit(0)
+    source.emit(1)
+    assert len(dead) == 1
+    assert L == [0.5, 1.0]
+    # the wrappers beneath stop recording
+    stats = {k.split()[0]: v for k, v in prof.stats.items()}
+    assert stats["a"]["calls"] == 1
+    status = {k.split()[0]: v for k, v in server.status.items()}
+    assert status["a"]["count"] == 1
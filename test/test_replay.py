@@ -0,0 +1,59 @@
+import pickle
+import time
+
+import pytest
+
+from streamz_ext import Stream
+from streamz_ext.replay import read_recording
+
+
+def test_record_replay(tmpdir):
+    np = pytest.importorskip("numpy")
+    fn = str(tmpdir.join("run.rec"))
+    source = Stream()
+    rec = source.record(fn)
+    L = rec.sink_to_list()
+    data = [np.arange(i, i + 10, dtype="f8") for i in range(5)]
+    for x in data + [{"a": 1}]:
+        source.emit(x)
+        time.sleep(0.02)
+    rec.close()
+    assert len(L) == 6
+
+    elements = [x for t, x in read_recording(fn)]
+    for a, b in zip(elements, data):
+        np.testing.assert_array_equal(a, b)
+        assert not a.flags.writeable
+        assert a.ctypes.data % 64 == 0
+    assert elements[-1] == {"a": 1}
+
+    for rate, expected in [(2.0, 0.05), (None, 0.0)]:
+        replay = Stream.replay(fn, rate=rate)
+        out = replay.map(lambda x: x).sink_to_list()
+        replay.start()
+        deadline = time.time() + 5
+        while not replay.stopped and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(out) == 6
+        report = replay.report()
+        assert report["elements"] == 6
+        assert report["duration"] >= expected
+        assert 0 <= report["latency"]["p50"] <= report["latency"]["max"]
+
+
+def test_record_in_band(tmpdir, monkeypatch):
+    # Python < 3.8 has no out of band pickling
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(pickle, "HIGHEST_PROTOCOL", 4)
+    fn = str(tmpdir.join("run.rec"))
+    source = Stream()
+    rec = source.record(fn)
+    data = [np.arange(i, i + 10, dtype="f8") for i in range(3)]
+    for x in data:
+        source.emit(x)
+    rec.close()
+
+    elements = [x for t, x in read_recording(fn)]
+    assert len(elements) == 3
+    for a, b in zip(elements, data):
+        np.testing.assert_array_equal(a, b)
@@ -0,0 +1,44 @@
+from operator import add, mul
+
+from streamz_ext import Stream
+from streamz_ext.serialize import dumps, loads, dump, load
+
+
+def make_namespace():
+    source = Stream(stream_name="source")
+    a = source.map(add, 1).accumulate(add, start=10)
+    b = source.filter(bool).partition(2).pluck(0)
+    out = a.zip(b, first=True).starmap(mul, stream_name="out")
+    return {"source": source, "out": out}
+
+
+def test_round_trip():
+    ns = make_namespace()
+    L = ns["out"].sink_to_list()
+    ns2 = loads(dumps(make_namespace()))
+    L2 = ns2["out"].sink_to_list()
+    for i in range(10):
+        ns["source"].emit(i)
+        ns2["source"].emit(i)
+    assert L2 == L
+    assert ns2["out"].name == "out"
+    assert [str(n) for n in ns2["source"].downstreams] == [
+        str(n) for n in ns["source"].downstreams
+    ]
+
+
+def test_file(tmpdir):
+    fn = str(tmpdir.join("pipeline.pkl"))
+    dump(make_namespace(), fn)
+    ns = load(fn)
+    L = ns["out"].sink_to_list()
+    for i in range(6):
+        ns["source"].emit(i)
+    assert L == [11 * 1, 13 * 3]
+
+
+def test_other_entries():
+    ns = make_namespace()
+    ns.update(config={"n": 2}, items=[1, 2], n=2)
+    ns2 = loads(dumps(ns))
+    assert set(ns2) == {"source", "out"}
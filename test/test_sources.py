@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+import pytest
+
+from streamz_ext import Stream
+from streamz_ext.sources import *
+
+try:
+    from zstreamz.tests.test_sources import *
+except ImportError:
+    pass
+
+
+def wait_for(predicate, timeout=2):
+    start = time.time()
+    while not predicate():
+        time.sleep(0.01)
+        assert time.time() < start + timeout
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is linux only"
+)
+def test_filenames_watch(tmpdir):
+    fn = str(tmpdir)
+    with open(os.path.join(fn, "a"), "w"):
+        pass
+
+    source = Stream.filenames(fn, watch=True, poll_interval=100)
+    L = source.sink_to_list()
+    source.start()
+    assert source.fd is not None
+
+    wait_for(lambda: len(L) == 1)
+
+    with open(os.path.join(fn, "b"), "w") as f:
+        f.write("data")
+        # files are only reported once they are closed
+        time.sleep(0.1)
+        assert len(L) == 1
+
+    wait_for(lambda: len(L) == 2)
+
+    assert L == [os.path.join(fn, x) for x in ["a", "b"]]
+    source.stop()
+
+
+def test_filenames_poll(tmpdir):
+    fn = str(tmpdir)
+    with open(os.path.join(fn, "a"), "w"):
+        pass
+
+    source = Stream.filenames(fn, watch=False, poll_interval=0.01)
+    L = source.sink_to_list()
+    source.start()
+    assert source.fd is None
+
+    with open(os.path.join(fn, "b"), "w"):
+        pass
+
+    wait_for(lambda: len(L) == 2)
+
+    assert L == [os.path.join(fn, x) for x in ["a", "b"]]
@@ -0,0 +1,55 @@
+import json
+from urllib.request import urlopen
+
+import pytest
+
+from streamz_ext import Stream
+from streamz_ext.status import StatusServer
+
+
+def test_status_server():
+    def inv(x):
+        return 1 / x
+
+    source = Stream()
+    m = source.map(inv, stream_name="inv")
+    L = m.sink_to_list()
+    with StatusServer(source) as server:
+        for i in [1, 2, 0]:
+            try:
+                source.emit(i)
+            except ZeroDivisionError:
+                pass
+        with urlopen(server.url + "status.json") as r:
+            status = json.loads(r.read().decode())
+        with urlopen(server.url) as r:
+            assert b"status.json" in r.read()
+    assert "update" not in m.__dict__
+    assert L == [1, 0.5]
+
+    nodes = {k.split()[0]: v for k, v in status["nodes"].items()}
+    assert nodes["inv"]["count"] == 2
+    assert nodes["inv"]["errors"] == 1
+    assert nodes["inv"]["status"] == "error"
+    assert "ZeroDivisionError" in nodes["inv"]["last_error"]
+    assert nodes["inv"]["latency"]["max"] >= nodes["inv"]["latency"]["p50"]
+    assert len(status["edges"]) == 2
+
+
+def test_status_server_keeps_later_wrappers():
+    source = Stream()
+    m = source.map(lambda x: 1 / x, stream_name="inv")
+    L = m.sink_to_list()
+    server = StatusServer(source)
+    server.start()
+    dead = m.isolate_failures().sink_to_list()
+    source.emit(2)
+    server.stop()
+
+    source.emit(0)
+    source.emit(1)
+    assert len(dead) == 1
+    assert L == [0.5, 1.0]
+    # the status server's wrapper beneath stops recording
+    status = {k.split()[0]: v for k, v in server.status.items()}
+    assert status["inv"]["count"] == 1
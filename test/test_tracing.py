@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from streamz_ext import Stream
+from streamz_ext.tracing import Tracer
+
+gen_test = pytest.mark.gen_test
+
+
+def inc(x):
+    return x + 1
+
+
+def test_tracer(tmpdir):
+    source = Stream()
+    a = source.map(inc, stream_name="a")
+    a.sink_to_list()
+    source.map(inc, stream_name="b").sink_to_list()
+
+    with Tracer(source) as tracer:
+        for i in range(3):
+            source.emit(i)
+    assert "update" not in a.__dict__ and "_emit" not in source.__dict__
+
+    updates = [e for e in tracer.events if e["ph"] == "X"]
+    assert len(updates) == 12
+    # both branches see the same ids
+    by_node = {}
+    for e in updates:
+        by_node.setdefault(e["name"].split()[0], []).append(
+            e["args"]["element"]
+        )
+    assert by_node["a"] == by_node["b"] == [0, 1, 2]
+
+    fn = str(tmpdir.join("trace.json"))
+    tracer.to_chrome(fn)
+    with open(fn) as f:
+        trace = json.load(f)
+    assert any(e["ph"] == "M" for e in trace["traceEvents"])
+
+
+@gen_test()
+def test_tracer_futures():
+    source = Stream(asynchronous=True)
+    L = source.scatter(backend="thread").map(inc).gather().sink_to_list()
+
+    with Tracer(source) as tracer:
+        for i in range(3):
+            yield source.emit(i)
+
+    assert L == [1, 2, 3]
+    begins = [e for e in tracer.events if e["ph"] == "b"]
+    ends = [e for e in tracer.events if e["ph"] == "e"]
+    assert begins and len(begins) == len(ends)
+    assert {e["args"]["element"] for e in begins} == {0, 1, 2}